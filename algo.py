@@ -1,4 +1,6 @@
 from processor import Processor
 from message import Message
 from channel import Channel
+from scheduler import ThreadScheduler, SimulationScheduler
+from timer_wheel import TimerWheelScheduler
 
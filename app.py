@@ -1,11 +1,27 @@
+import json
+import os
+import time
+import uuid
+
+from async_scheduler import AsyncioScheduler
 from channel import Channel
 from processor import Processor
+from scenario import Scenario
+from scheduler import ThreadScheduler
+from timer_wheel import TimerWheelScheduler
+from trace_log import TraceRecorder
+from worker_pool import WorkerPool
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 
 app = Flask(__name__)
 properties = {}
 
+EVENT_HEARTBEAT = 15.0
+EVENT_BATCH_INTERVAL = 0.1
+# Traces are only written when the server is started with a directory for them, clients never choose the file
+TRACE_DIRECTORY = os.environ.get('MEMBERSHIP_TRACE_DIR')
+
 
 @app.route('/')
 def index():
@@ -31,29 +47,121 @@ def neighborhood_protocol():
     return render_template('index.html')
 
 
+@app.route('/hierarchical-protocol')
+def hierarchical_protocol():
+    properties['protocol'] = Processor.HIERARCHICAL_PROTOCOL
+    return render_template('index.html')
+
+
 @app.route('/all-processors')
 def get_all_processors():
-    data = []
-    for processor in properties['channel'].processors:
-        status = 'Normal' if processor.status == Processor.NORMAL else 'Crashed'
-        data.append({'id': processor.id, 'status': status, 'members': processor.members})
-    return jsonify(data), 200
+    """Lists the processors, or with ?since=<version> only those changed after that version
+
+    Every listing is read from one snapshot of the group, so it is consistent even while the protocol runs. The full
+    listing can be paged with ?offset= and ?limit= and carries an ETag, so an unchanged group is answered with 304.
+    The X-Group-Version header holds the version the listing is at, the one to pass to since or /events.
+    """
+    channel = properties['channel']
+
+    since = request.args.get('since', type=int)
+    if since is not None:
+        version, changed = channel.changes.since(since)
+        snapshot = channel.snapshot
+        if changed is None:
+            version, states = snapshot.version, snapshot.processors
+        else:
+            states = [snapshot.find(i) for i in changed]
+        data = {'version': version, 'reset': changed is None,
+                'processors': [_processor_state(channel, state) for state in states]}
+        return jsonify(data), 200, {'X-Group-Version': str(version)}
+
+    snapshot = channel.snapshot
+    headers = {'X-Group-Version': str(snapshot.version)}
+    etag = f'{id(channel):x}-{snapshot.version}'
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={**headers, 'ETag': f'"{etag}"'})
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', len(snapshot), type=int)
+    response = jsonify([_processor_state(channel, s) for s in snapshot.processors[offset:offset + limit]])
+    response.headers.update(headers)
+    response.headers['X-Total-Count'] = str(len(snapshot))
+    response.set_etag(etag)
+    return response, 200
+
+
+@app.route('/events')
+def processor_events():
+    """Streams the processors whose status or membership changed as server-sent events
+
+    Each event carries the version it brings the client to as its id, so a reconnecting EventSource resumes from
+    Last-Event-ID. Changes are coalesced for EVENT_BATCH_INTERVAL seconds before being sent. A 'reset' event tells
+    the client to fetch the full listing again, either because it fell behind the change log or the group was
+    re-created.
+    """
+    channel = properties['channel']
+    version = int(request.headers.get('Last-Event-ID') or request.args.get('since') or 0)
+
+    def stream(version):
+        while properties.get('channel') is channel:
+            if channel.changes.wait(version, EVENT_HEARTBEAT) == version:
+                yield ': heartbeat\n\n'
+                continue
+            time.sleep(EVENT_BATCH_INTERVAL)
+            version, changed = channel.changes.since(version)
+            if changed is None:
+                break
+            snapshot = channel.snapshot
+            data = json.dumps({'version': version,
+                               'processors': [_processor_state(channel, snapshot.find(i)) for i in changed]})
+            yield f'id: {version}\ndata: {data}\n\n'
+        yield 'event: reset\ndata: {}\n\n'
+
+    return Response(stream(version), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+def _processor_state(channel, state):
+    """Returns the JSON form of a ProcessorState"""
+    status = 'Normal' if state.status == Processor.NORMAL else 'Crashed'
+    group_time = channel.scheduler.to_datetime(state.group).isoformat() if state.group else None
+    return {'id': state.id, 'status': status, 'members': [*state.view], 'group': group_time}
+
+
+@app.route('/metrics')
+def metrics():
+    if 'channel' not in properties:
+        return Response('', mimetype='text/plain; version=0.0.4')
+    return Response(properties['channel'].metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/join')
 def init_join_for_all_processors():
-    for processor in properties['channel'].processors:
-        processor.init_join()
+    """Re-forms the group, with join coalescing a single NEW_GROUP from the first correct processor does it"""
+    processors = [p for p in properties['channel'].processors if p.status == Processor.NORMAL]
+    if properties.get('join_coalescing'):
+        processors = processors[:1]
+    for processor in processors:
+        properties['channel'].dispatch(processor, processor.init_join)
     return '', 200
 
 
 @app.route('/init', methods=['POST'])
 def init_processors():
     data = request.json
+    runtime = data.pop('runtime', 'thread')
+    join_coalescing = bool(data.pop('join_coalescing', False))
+    trace = bool(data.pop('trace', False))
+    if trace and TRACE_DIRECTORY is None:
+        return 'Tracing is not enabled on this server', 400
     for key, value in data.items():
         data[key] = int(value)
+    data['runtime'] = runtime
+    data['join_coalescing'] = join_coalescing
+    data['trace_path'] = os.path.join(TRACE_DIRECTORY, f'{uuid.uuid4().hex}.trace') if trace else None
     setup(data)
     init_join_for_all_processors()
+    if trace:
+        # Only the generated name is handed out, the directory stays private to the server
+        return jsonify({'trace': os.path.basename(data['trace_path'])}), 200
     return '', 200
 
 
@@ -64,19 +172,60 @@ def crash_processor():
     processor = properties['channel'].find_processor(processor_id)
     if processor is None:
         return 'Invalid Processor', 404
-    processor.crash()
+    properties['channel'].dispatch(processor, processor.crash)
     return '', 200
 
 
+@app.route('/scenario', methods=['POST'])
+def start_scenario():
+    """Starts a timed script of bulk crashes, recoveries, additions and delay changes on the running group
+
+    The body is a scenario in the JSON form of scenario.Scenario, its times are relative to when it is posted.
+    """
+    try:
+        scenario = Scenario.from_json(request.json)
+    except ValueError as e:
+        return str(e), 400
+    if 'channel' not in properties:
+        return 'No group', 404
+    scenario.start(properties['channel'])
+    return jsonify({'events': len(scenario), 'batches': len(scenario.batches())}), 200
+
+
+def make_scheduler(runtime):
+    """Returns a started scheduler for the given runtime name: 'thread', 'timer-wheel' or 'asyncio'"""
+    if runtime == 'asyncio':
+        scheduler = AsyncioScheduler()
+        scheduler.start()
+        return scheduler
+    if runtime == 'timer-wheel':
+        return TimerWheelScheduler()
+    return ThreadScheduler()
+
+
 def setup(kwargs):
+    """Replaces the group with a new one built from the given settings
+
+    The thread and timer-wheel runtimes fire callbacks on many threads, so their channel gets a WorkerPool of
+    'workers' threads that handles each processor on one thread at a time; asyncio runs everything on its loop.
+    """
     if 'channel' in properties:
         properties['channel'].close()
+        properties['channel'].scheduler.stop()
+        if properties['channel'].workers is not None:
+            properties['channel'].workers.stop()
 
     properties.update(kwargs)
-    channel = Channel(properties['broadcast_delay'], properties['datagram_delay'])
+    runtime = properties.get('runtime', 'thread')
+    scheduler = make_scheduler(runtime)
+    trace_path = properties.get('trace_path')
+    recorder = TraceRecorder(trace_path) if trace_path else None
+    workers = WorkerPool(int(properties.get('workers', 4))) if runtime != 'asyncio' else None
+    channel = Channel(properties['broadcast_delay'], properties['datagram_delay'], scheduler, recorder=recorder,
+                      workers=workers)
     for _ in range(int(properties['num_processors'])):
         p = Processor(channel, properties['max_clock_sync_error'], properties['check_in_period'],
-                      properties['protocol'])
+                      properties['protocol'], properties.get('join_coalescing', False))
         channel.register_processor(p)
     properties['channel'] = channel
 
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+from scheduler import monotonic_to_datetime
+
+
+class AsyncioTimer:
+    """A cancellable handle for a callback scheduled on an AsyncioScheduler
+
+    The handle can be cancelled from any thread; cancelling from outside the event loop is forwarded to the loop.
+
+    Attributes:
+        _loop: The event loop the callback is scheduled on
+        _handle: The asyncio.TimerHandle once the loop has scheduled the callback, None before that
+        _cancelled: A bool indicating whether the timer has been cancelled
+    """
+
+    __slots__ = ('_loop', '_handle', '_cancelled')
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._handle = None
+        self._cancelled = False
+
+    def cancel(self):
+        """Cancels the callback if it has not run yet"""
+        self._cancelled = True
+        if _in_loop(self._loop):
+            self._cancel()
+        else:
+            self._loop.call_soon_threadsafe(self._cancel)
+
+    def _schedule(self, delay, callback, args):
+        if not self._cancelled:
+            self._handle = self._loop.call_later(delay, callback, *args)
+
+    def _cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+
+
+class AsyncioScheduler:
+    """A scheduler that runs every delivery and processor timer on one asyncio event loop
+
+    Each event becomes a loop.call_later callback instead of a threading.Timer, so the whole group is hosted by a
+    single thread without creating a thread per message. The loop can be driven by the caller's own asyncio code, or
+    by a background thread started with start(), which is how app.py uses it.
+
+    Attributes:
+        _loop: The asyncio event loop that runs the callbacks
+        _thread: The background thread running the loop, None if the loop is driven by the caller
+    """
+
+    def __init__(self, loop=None):
+        self._loop = asyncio.new_event_loop() if loop is None else loop
+        self._thread = None
+
+    @staticmethod
+    def now():
+        """Returns the current monotonic time in seconds, the same clock the default event loop uses"""
+        return time.monotonic()
+
+    @staticmethod
+    def to_datetime(seconds):
+        """Returns the local datetime of a reading of now(), for display only"""
+        return monotonic_to_datetime(seconds)
+
+    def call_later(self, delay, callback, *args):
+        """Schedules callback(*args) on the event loop after delay seconds, it is safe to call from any thread
+
+        Returns:
+            An AsyncioTimer that can be cancelled
+        """
+        timer = AsyncioTimer(self._loop)
+        if _in_loop(self._loop):
+            timer._schedule(delay, callback, args)
+        else:
+            self._loop.call_soon_threadsafe(timer._schedule, delay, callback, args)
+        return timer
+
+    def start(self):
+        """Runs the event loop forever in a background daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop.run_forever, name='asyncio-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the background thread started by start()"""
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def loop(self):
+        return self._loop
+
+
+def _in_loop(loop):
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
@@ -0,0 +1,155 @@
+import argparse
+import itertools
+import json
+import time
+import tracemalloc
+
+from channel import Channel
+from membership import MemberView
+from processor import Processor
+from profiling import CollapsedStackSink, Profiler
+from scheduler import SimulationScheduler
+
+PROTOCOLS = {
+    'periodic-broadcast': Processor.PERIODIC_BROADCAST_PROTOCOL,
+    'attendance-list': Processor.ATTENDANCE_LIST_PROTOCOL,
+    'neighborhood-surveillance': Processor.NEIGHBOR_SURVEILLANCE_PROTOCOL,
+    'hierarchical': Processor.HIERARCHICAL_PROTOCOL,
+}
+
+
+def build_group(protocol, num_processors, broadcast_delay, datagram_delay, check_in_period, max_clock_sync_error,
+                batch_tick=None, seed=None, join_coalescing=False, attendance_tokens=1, recorder=None, profiler=None):
+    """Returns a (scheduler, channel) pair with num_processors registered processors on a virtual clock
+
+    A TraceRecorder given as recorder traces the channel, see trace_log.py, and a Profiler given as profiler times
+    it, see profiling.py.
+    """
+    scheduler = SimulationScheduler()
+    channel = Channel(broadcast_delay, datagram_delay, scheduler, batch_tick=batch_tick, seed=seed,
+                      recorder=recorder, profiler=profiler)
+    for _ in range(num_processors):
+        channel.register_processor(Processor(channel, max_clock_sync_error, check_in_period, PROTOCOLS[protocol],
+                                             join_coalescing, attendance_tokens))
+    return scheduler, channel
+
+
+def wait_for_agreement(scheduler, channel, poll_interval, timeout):
+    """Runs the scheduler until every correct processor's view is exactly the set of correct processors
+
+    Returns:
+        The virtual time it took in seconds, or None if the views did not agree within timeout.
+    """
+    start = scheduler.now()
+    while scheduler.now() - start <= timeout:
+        correct = [p for p in channel.processors if p.status == Processor.NORMAL]
+        expected = MemberView(p.id for p in correct)
+        if all(p.view == expected for p in correct):
+            return scheduler.now() - start
+        scheduler.run_for(poll_interval)
+    return None
+
+
+def run_scenario(protocol, num_processors, broadcast_delay, datagram_delay, check_in_period, max_clock_sync_error,
+                 measured_periods=3, seed=0, batch_tick=None, join_coalescing=False, attendance_tokens=1,
+                 profiler=None):
+    """Runs one benchmark scenario on a virtual clock and returns its results as a dict
+
+    The group is formed by every processor calling init_join at once. Once the views agree, the steady-state
+    message cost is measured over measured_periods check-in periods, then one processor crashes and the time until
+    the survivors agree on a view without it is measured, along with the messages sent until then.
+    """
+    tracemalloc.start()
+    cpu_start = time.process_time()
+    poll_interval = min(broadcast_delay, datagram_delay) / 4
+    timeout = 10 * check_in_period + num_processors * datagram_delay
+
+    scheduler, channel = build_group(protocol, num_processors, broadcast_delay, datagram_delay, check_in_period,
+                                     max_clock_sync_error, batch_tick, seed, join_coalescing, attendance_tokens,
+                                     profiler=profiler)
+    for processor in channel.processors:
+        processor.init_join()
+    convergence_time = wait_for_agreement(scheduler, channel, poll_interval, timeout)
+
+    sent_before = sum(channel.sent_counts.values())
+    scheduler.run_for(measured_periods * check_in_period)
+    messages_per_period = (sum(channel.sent_counts.values()) - sent_before) / measured_periods
+
+    processors = channel.processors
+    sent_before = sum(channel.sent_counts.values())
+    processors[len(processors) // 2].crash()
+    detection_latency = wait_for_agreement(scheduler, channel, poll_interval, timeout)
+    failure_messages = sum(channel.sent_counts.values()) - sent_before
+
+    cpu_seconds = time.process_time() - cpu_start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'protocol': protocol,
+        'num_processors': num_processors,
+        'broadcast_delay': broadcast_delay,
+        'datagram_delay': datagram_delay,
+        'check_in_period': check_in_period,
+        'max_clock_sync_error': max_clock_sync_error,
+        'batch_tick': batch_tick,
+        'join_coalescing': join_coalescing,
+        'attendance_tokens': attendance_tokens,
+        'seed': seed,
+        'convergence_time': convergence_time,
+        'detection_latency': detection_latency,
+        'messages_per_period': messages_per_period,
+        'failure_messages': failure_messages,
+        'cpu_seconds': cpu_seconds,
+        'peak_memory_bytes': peak_memory,
+    }
+
+
+def _format_seconds(seconds):
+    return 'never' if seconds is None else f'{seconds:.3f}s'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the check-in protocols on a virtual clock.')
+    parser.add_argument('--protocols', nargs='+', choices=PROTOCOLS, default=list(PROTOCOLS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 50, 100])
+    parser.add_argument('--broadcast-delays', nargs='+', type=float, default=[0.1])
+    parser.add_argument('--datagram-delays', nargs='+', type=float, default=[0.01])
+    parser.add_argument('--check-in-periods', nargs='+', type=float, default=[5])
+    parser.add_argument('--max-clock-sync-error', type=float, default=0.05)
+    parser.add_argument('--measured-periods', type=int, default=3)
+    parser.add_argument('--batch-tick', type=float, default=None)
+    parser.add_argument('--join-coalescing', action='store_true', help='let one detector re-form the group per failure')
+    parser.add_argument('--attendance-tokens', type=int, default=1,
+                        help='attendance lists circulating at once under the attendance-list protocol')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the results are written to')
+    parser.add_argument('--profile', help='file the collapsed stacks of all runs are written to, for a flame graph')
+    parser.add_argument('--profile-sample-every', type=int, default=1,
+                        help='time one in this many top-level sends and deliveries')
+    args = parser.parse_args()
+
+    stacks = CollapsedStackSink() if args.profile else None
+    profiler = Profiler(stacks, sample_every=args.profile_sample_every) if args.profile else None
+    results = []
+    grid = itertools.product(args.protocols, args.sizes, args.broadcast_delays, args.datagram_delays,
+                             args.check_in_periods)
+    for protocol, size, broadcast_delay, datagram_delay, check_in_period in grid:
+        result = run_scenario(protocol, size, broadcast_delay, datagram_delay, check_in_period,
+                              args.max_clock_sync_error, args.measured_periods, args.seed, args.batch_tick,
+                              args.join_coalescing, args.attendance_tokens, profiler)
+        results.append(result)
+        print(f"{protocol:26} N={size:<5} bd={broadcast_delay:<5} dd={datagram_delay:<5} period={check_in_period:<5} "
+              f"converge={_format_seconds(result['convergence_time'])} "
+              f"detect={_format_seconds(result['detection_latency'])} "
+              f"msgs/period={result['messages_per_period']:.0f} failure_msgs={result['failure_messages']} "
+              f"cpu={result['cpu_seconds']:.2f}s "
+              f"peak={result['peak_memory_bytes'] / 2 ** 20:.1f}MiB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if stacks is not None:
+        stacks.write(args.profile)
+
+
+if __name__ == '__main__':
+    main()
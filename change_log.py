@@ -0,0 +1,133 @@
+import collections
+import threading
+
+ProcessorState = collections.namedtuple('ProcessorState', ('id', 'status', 'view', 'group'))
+ProcessorState.__doc__ = """The status, membership view and group V timestamp of one processor at some version"""
+
+
+class GroupSnapshot:
+    """An immutable picture of every processor's state at one version of a ChangeLog
+
+    Attributes:
+        version: A int indicating the version of the ChangeLog the snapshot was taken at
+        processors: A tuple of ProcessorState in registration order
+        _by_id: A dict mapping each processor id to its ProcessorState
+    """
+
+    __slots__ = ('version', 'processors', '_by_id')
+
+    def __init__(self, version, states):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'processors', tuple(states.values()))
+        object.__setattr__(self, '_by_id', dict(states))
+
+    def find(self, processor_id):
+        """Returns the ProcessorState of the given processor, None if it is not in the snapshot"""
+        return self._by_id.get(processor_id)
+
+    def __len__(self):
+        return len(self.processors)
+
+    def __iter__(self):
+        return iter(self.processors)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('GroupSnapshot is immutable')
+
+
+class ChangeLog:
+    """A bounded, versioned log of processor state changes with copy-on-write snapshots of the whole group
+
+    Every change gets the next version number. Readers remember the last version they saw and ask for the processors
+    changed after it, so they only ever re-render what actually changed. Only the newest capacity changes are kept; a
+    reader that falls further behind is told to start over from a full listing.
+
+    Writers only replace one processor's entry under the lock. The first reader after a change copies the entries into
+    a GroupSnapshot without taking the lock, and every later reader gets it back as is until the next change, so
+    polling an idle group costs O(1) and no read ever holds up the protocol for longer than O(1).
+
+    Attributes:
+        _version: A int indicating the version of the newest change
+        _sequence: A int that is odd while a change is being written and moves on with every change, the counter of
+                   the seqlock snapshot() copies the entries under
+        _entries: A deque of (version, processor id) pairs, oldest first
+        _states: A dict mapping each processor id to its latest ProcessorState, in registration order
+        _snapshot: The GroupSnapshot of the latest version, None when a change has made it stale
+        _condition: A threading.Condition notified whenever a change is appended
+    """
+
+    def __init__(self, capacity=10000):
+        self._version = 0
+        self._sequence = 0
+        self._entries = collections.deque(maxlen=capacity)
+        self._states = {}
+        self._snapshot = GroupSnapshot(0, {})
+        self._condition = threading.Condition()
+
+    def append(self, state):
+        """Records the ProcessorState as the latest state of its processor and returns the version of the change"""
+        with self._condition:
+            # The sequence is odd while the state and version change, so snapshot() never keeps a copy taken meanwhile
+            self._sequence += 1
+            self._snapshot = None
+            self._states[state.id] = state
+            self._version += 1
+            self._sequence += 1
+            self._entries.append((self._version, state.id))
+            self._condition.notify_all()
+            return self._version
+
+    def snapshot(self):
+        """Returns the GroupSnapshot of the latest version
+
+        The entries are copied without the lock, as a seqlock reader: the copy is taken again while a change is being
+        written or if one was written while it was made, so it always holds exactly the states of the version it is
+        labelled with. Only publishing the finished snapshot takes the lock, for O(1).
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        while True:
+            sequence = self._sequence
+            if sequence % 2:
+                continue
+            version = self._version
+            states = dict(self._states)
+            if self._sequence == sequence:
+                break
+        snapshot = GroupSnapshot(version, states)
+        with self._condition:
+            if self._sequence == sequence:
+                self._snapshot = snapshot
+        return snapshot
+
+    def since(self, version):
+        """Returns the processors changed after the given version
+
+        Returns:
+            A (version, processor ids) pair with the latest version and the ascending ids of the processors changed
+            after the given one, the ids are None if some of those changes have already been dropped from the log or
+            the given version is not one of this log's.
+        """
+        with self._condition:
+            latest = self._version
+            if version == latest:
+                return latest, []
+            if version > latest or not self._entries or self._entries[0][0] > version + 1:
+                return latest, None
+            changed = set()
+            for entry_version, processor_id in reversed(self._entries):
+                if entry_version <= version:
+                    break
+                changed.add(processor_id)
+            return latest, sorted(changed)
+
+    def wait(self, version, timeout=None):
+        """Blocks until the log moves off the given version or the timeout passes, returns the latest version"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    @property
+    def version(self):
+        return self._version
@@ -1,10 +1,22 @@
-import datetime
+import itertools
 import random
-import time
+import threading
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from change_log import ChangeLog, ProcessorState
 from message import Message
+from metrics import Counter, Gauge, Histogram, MetricsRegistry
 from processor import Processor
-from threading import Timer
+from scheduler import ThreadScheduler
+from transport import InMemoryTransport
+from worker_pool import MailboxTimer
+
+DELAY_RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.25, 1.5, 2.0, 5.0)
+DETECTION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0)
 
 
 class Channel:
@@ -17,15 +29,117 @@ class Channel:
     Attributes:
         _broadcast_delay: A float represents the upper bound time delay for broadcast
         _datagram_delay: A float represents the upper bound time delay for direct message sending
-        _all_processors: A list keeps track of all processors in this channel
+        _all_processors: A dict keeps track of all processors in this channel, keyed by processor id
+        _correct_processors: A dict keeps track of the processors whose status is NORMAL, keyed by processor id
+        _correct_snapshot: A tuple of the correct processors that broadcast iterates over, None when it is stale
         _messages: A list keeps track of all messages being created through this channel
+        _metrics: A MetricsRegistry with the message, timer, join and failure-detection metrics of this channel
+        _pending_crashes: A dict mapping the id of each crashed processor that some correct processor still counts as a
+                          member to a [crash time, number of correct views containing it] list
+        _crash_lock: A threading.Lock guarding _pending_crashes and the changes to _correct_processors, timer threads
+                     and worker pool workers update them for different processors at once
+        _scheduler: The scheduler that runs message deliveries and processor timers, a ThreadScheduler by default
+        _batch_tick: A float indicating the tick length in seconds used to batch broadcast deliveries, None to deliver
+                     every broadcast copy on its own
+        _tick_batches: A dict mapping the index of each tick on the channel's time grid to the list of (message,
+                       receiver, sent time) broadcast copies due in it, across all broadcasts
+        _tick_lock: A threading.Lock guarding _tick_batches, broadcasts and tick deliveries may run on many threads
+        _random: A random.Random drawing the message delays and the processors' clock errors of this channel
+        _processor_ids: An iterator handing out the ids of processors created for this channel
+        _message_ids: An iterator handing out the ids of messages created through this channel
+        _transport: The transport carrying messages to processors hosted by other processes, an InMemoryTransport
+                    by default
+        _changes: A ChangeLog of the processors' status, view and group changes, read by the app through snapshots and
+                  the delta stream
+        _recorder: A TraceRecorder writing every send, delivery, timer fire and crash to a trace file, None when the
+                   channel is not traced
+        _workers: A WorkerPool running every delivery and processor timer through the processor's mailbox, so each
+                  processor is handled by one thread at a time, None to run them on the scheduler's thread
+        _profiler: A Profiler timing the send and deliver path and the processors' message handling, None when the
+                   channel is not profiled
     """
 
-    def __init__(self, broadcast_delay, datagram_delay):
+    def __init__(self, broadcast_delay, datagram_delay, scheduler=None, batch_tick=None, seed=None, transport=None,
+                 recorder=None, workers=None, profiler=None):
+        """Inits the channel, runs with the same seed on a SimulationScheduler draw the same delays"""
         self._broadcast_delay = broadcast_delay
         self._datagram_delay = datagram_delay
-        self._all_processors = []
+        self._all_processors = {}
+        self._correct_processors = {}
+        self._correct_snapshot = None
         self._messages = []
+        self._pending_crashes = {}
+        self._crash_lock = threading.Lock()
+        self._scheduler = ThreadScheduler() if scheduler is None else scheduler
+        self._batch_tick = batch_tick
+        self._tick_batches = {}
+        self._tick_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._numpy_random = numpy.random.default_rng(seed) if numpy is not None else None
+        self._transport = InMemoryTransport() if transport is None else transport
+        self._processor_ids = self._transport.local_ids()
+        self._message_ids = itertools.count(0)
+        self._changes = ChangeLog()
+        self._recorder = recorder
+        self._workers = workers
+        self._profiler = profiler
+        self._register_metrics()
+        self._transport.attach(self)
+        if recorder is not None:
+            recorder.attach(self)
+        if profiler is not None:
+            self._install_profiler(profiler)
+
+    def _install_profiler(self, profiler):
+        # The profiled methods shadow the class's on this instance only, so unprofiled channels pay nothing
+        self.create_message = profiler.wrap('create_message', self.create_message, lambda processor, msg_type: msg_type)
+        self.send_message = profiler.wrap('send', self.send_message, _message_type)
+        self.broadcast = profiler.wrap('broadcast', self.broadcast, _message_type)
+        self._send_message_to = profiler.wrap('deliver', self._send_message_to, _message_type,
+                                              lambda message, processor, sent_at, *_: self._scheduler.now() - sent_at)
+
+    def _register_metrics(self):
+        registry = self._metrics = MetricsRegistry()
+        self._sent_total = registry.register(Counter(
+            'membership_messages_sent_total', 'Message copies put on the wire', ('type',)))
+        self._delivered_total = registry.register(Counter(
+            'membership_messages_delivered_total', 'Message copies handed to a processor', ('type',)))
+        self._delay_ratio = registry.register(Histogram(
+            'membership_delivery_delay_ratio', 'Actual delivery delay divided by the configured delay bound',
+            DELAY_RATIO_BUCKETS, ('kind',)))
+        registry.register(Gauge(
+            'membership_delay_bound_seconds', 'Configured delay bounds',
+            lambda: {('broadcast',): self._broadcast_delay, ('datagram',): self._datagram_delay}, ('kind',)))
+        registry.register(Gauge(
+            'membership_timers_outstanding', 'Timers and deliveries waiting in the scheduler',
+            lambda: {(): self._scheduler.stats()['backlog']} if hasattr(self._scheduler, 'stats') else {}))
+        registry.register(Gauge(
+            'membership_mailbox_backlog', 'Deliveries and timers waiting in processor mailboxes for a worker',
+            lambda: {(): self._workers.stats()['backlog']} if self._workers is not None else {}))
+        self._init_join_total = registry.register(Counter(
+            'membership_init_join_total', 'Group re-formations started, by cause', ('cause',)))
+        self._join_suppressed_total = registry.register(Counter(
+            'membership_join_suppressed_total', 'Re-formations dropped by join coalescing, by cause', ('cause',)))
+        self._detection_seconds = registry.register(Histogram(
+            'membership_crash_detection_seconds', "Time from a crash to the last survivor's view change excluding it",
+            DETECTION_BUCKETS))
+        self._processor_sent_total = registry.register(Counter(
+            'membership_processor_messages_sent_total', 'Message copies sent by each processor', ('processor',)))
+        self._processor_received_total = registry.register(Counter(
+            'membership_processor_messages_received_total', 'Message copies delivered to each processor',
+            ('processor',)))
+        registry.register(Gauge(
+            'membership_processors', 'Registered processors by status',
+            lambda: {('normal',): len(self._correct_processors),
+                     ('crashed',): len(self._all_processors) - len(self._correct_processors)}, ('status',)))
+
+    def next_processor_id(self):
+        """Returns a new processor id, ids are unique within this channel only"""
+        return next(self._processor_ids)
+
+    def next_message_id(self):
+        """Returns a new message id, ids are unique within this channel only"""
+        return next(self._message_ids)
 
     def register_processor(self, processor):
         """Registers the given processor to the channel
@@ -35,8 +149,95 @@ class Channel:
         """
         if processor in self:
             return False
-        self._all_processors.append(processor)
-        return False
+        self._all_processors[processor.id] = processor
+        if self._recorder is not None:
+            self._recorder.processor_registered(processor)
+        if self._profiler is not None:
+            processor.receive = self._profiler.wrap('receive', processor.receive, _message_type)
+        self.update_status(processor)
+        return True
+
+    def update_status(self, processor):
+        """Keeps the set of correct processors in step with the status of the given processor
+
+        Processors call this whenever their status changes; unregistered processors are ignored.
+        """
+        if processor.id not in self._all_processors:
+            return
+        crashed = False
+        with self._crash_lock:
+            if processor.status == Processor.NORMAL:
+                self._correct_processors[processor.id] = processor
+                self._pending_crashes.pop(processor.id, None)
+            elif self._correct_processors.pop(processor.id, None) is not None:
+                crashed = True
+                # A crashed view no longer counts as holding the other pending crashes
+                for crashed_id in [i for i in self._pending_crashes if i in processor.view]:
+                    self._drop_holder(crashed_id)
+                holders = sum(1 for p in self._correct_processors.values() if processor.id in p.view)
+                if holders:
+                    self._pending_crashes[processor.id] = [self._scheduler.now(), holders]
+                else:
+                    self._detection_seconds.observe(0.0)
+        if crashed and self._recorder is not None:
+            self._recorder.crashed(processor)
+        self._correct_snapshot = None
+        self._publish_state(processor)
+
+    def view_changed(self, processor, old_view, new_view):
+        """Records a change of the given processor's membership view or group
+
+        When the last correct view containing a crashed processor drops it, the time since the crash is recorded as
+        the failure-detection latency.
+        """
+        self._publish_state(processor)
+        if self._recorder is not None:
+            self._recorder.view_changed(processor)
+        if processor.status != Processor.NORMAL:
+            # Only correct views are counted as holders, a crashed one stopped counting in update_status
+            return
+        with self._crash_lock:
+            for crashed_id, pending in list(self._pending_crashes.items()):
+                if crashed_id in old_view and crashed_id not in new_view:
+                    self._drop_holder(crashed_id)
+                elif crashed_id in new_view and crashed_id not in old_view:
+                    pending[1] += 1
+
+    def _drop_holder(self, crashed_id):
+        """Counts one correct view less containing the crashed processor, the last one records the detection latency
+
+        Callers hold _crash_lock. A crash that is no longer pending, because it has been recorded or the processor has
+        recovered, is left alone.
+        """
+        pending = self._pending_crashes.get(crashed_id)
+        if pending is None:
+            return
+        pending[1] -= 1
+        if pending[1] == 0:
+            del self._pending_crashes[crashed_id]
+            self._detection_seconds.observe(self._scheduler.now() - pending[0])
+
+    def _publish_state(self, processor):
+        self._changes.append(ProcessorState(processor.id, processor.status, processor.view, processor.group))
+
+    def set_delays(self, broadcast_delay=None, datagram_delay=None):
+        """Changes the delay bounds of the running channel, messages already on their way keep their delays"""
+        if broadcast_delay is not None:
+            self._broadcast_delay = broadcast_delay
+        if datagram_delay is not None:
+            self._datagram_delay = datagram_delay
+        if self._recorder is not None:
+            self._recorder.delays_changed(self)
+
+    def record_init_join(self, cause, processor=None):
+        """Counts a group re-formation started by the given processor for the given cause"""
+        self._init_join_total.inc(cause)
+        if self._recorder is not None and processor is not None:
+            self._recorder.joined(processor, cause)
+
+    def record_join_suppressed(self, cause):
+        """Counts a re-formation for the given cause that join coalescing dropped"""
+        self._join_suppressed_total.inc(cause)
 
     def create_message(self, processor, msg_type):
         """Creates a message in this channel
@@ -46,45 +247,190 @@ class Channel:
         """
         self._assert_processor_registered(processor)
         m = Message(processor, self, msg_type)
+        if self._recorder is not None:
+            self._recorder.created(m)
         return m
 
-    @staticmethod
-    def _send_message_to(message, processor):
-        processor.receive(message)
+    def schedule_timer(self, processor, delay, callback, *args):
+        """Schedules a timer of the given processor to call callback(*args) delay seconds from now
+
+        With a worker pool the callback goes through the processor's mailbox when the timer fires, and cancelling the
+        returned MailboxTimer also drops it from there.
+
+        Returns:
+            A timer handle that can be cancelled
+        """
+        if self._workers is None:
+            return self._call_timer(processor, delay, callback, args)
+        timer = MailboxTimer(callback, args)
+        timer.handle = self._call_timer(processor, delay, self._workers.post, (processor, timer.run))
+        return timer
+
+    def _call_timer(self, processor, delay, callback, args):
+        if self._recorder is None:
+            return self._scheduler.call_later(delay, callback, *args)
+        return self._scheduler.call_later(delay, self._recorder.timer_fired, processor,
+                                          self._recorder.timer_scheduled(processor), callback, args)
+
+    def dispatch(self, processor, callback, *args):
+        """Runs callback(*args) for the given processor, through its mailbox when the channel has a worker pool
+
+        Callers outside the scheduler, like the web app and scenarios, use this to crash, recover or re-join a
+        processor without racing its message handlers.
+        """
+        if self._workers is None:
+            callback(*args)
+        else:
+            self._workers.post(processor, callback, *args)
+
+    def _send_message_to(self, message, processor, sent_at, kind, bound):
+        self._record_delivery(message, processor, sent_at, kind, bound)
+        if self._recorder is not None:
+            self._recorder.delivered(message, processor)
+        if self._workers is None:
+            processor.receive(message)
+        else:
+            self._workers.post(processor, processor.receive, message)
 
     def send_message(self, message):
+        receiver_id = message.receiver.id
+        if receiver_id not in self._all_processors and not self._transport.is_local(receiver_id):
+            self._sent_total.inc(Message.TYPE_NAMES[message.type])
+            self._processor_sent_total.inc(message.sender.id)
+            self._transport.send(message, self._scheduler.now(), receiver_id)
+            return
         self._assert_processor_registered(message.receiver)
         if message.receiver.status == Processor.CRASHED:
             return
-        delay = random.random() * self._datagram_delay
-        t = Timer(delay, self._send_message_to, args=(message, message.receiver))
-        t.start()
+        self._sent_total.inc(Message.TYPE_NAMES[message.type])
+        self._processor_sent_total.inc(message.sender.id)
+        if self._recorder is not None:
+            self._recorder.sent(message, receiver_id)
+        delay = self._random.random() * self._datagram_delay
+        self._scheduler.call_later(delay, self._send_message_to, message, message.receiver, self._scheduler.now(),
+                                   'datagram', self._datagram_delay)
+
+    def _deliver_tick(self, tick):
+        with self._tick_lock:
+            copies = self._tick_batches.pop(tick)
+        for message, processor, sent_at in copies:
+            self._send_message_to(message, processor, sent_at, 'broadcast', self._broadcast_delay)
+
+    def _record_delivery(self, message, processor, sent_at, kind, bound):
+        self._delivered_total.inc(Message.TYPE_NAMES[message.type])
+        self._processor_received_total.inc(processor.id)
+        self._delay_ratio.observe((self._scheduler.now() - sent_at) / bound, kind)
 
     def broadcast(self, message):
-        """Broadcasts the message to all correct processors registered in this channel. """
+        """Broadcasts the message to all correct processors registered in this channel.
+
+        The same message object is delivered to every receiver, so it is frozen first. When the channel has a batch
+        tick, the delays of all receivers are drawn in one go and every copy, of this broadcast or any other, whose
+        delivery falls in the same tick is delivered by a single scheduled event.
+        """
         if message.sender.status == Processor.CRASHED:
             return
-        all_correct_processors = (p for p in self._all_processors if
-                                  p.status == Processor.NORMAL and p != message.sender)
+        message.freeze()
+        all_correct_processors = self._correct_snapshot
+        if all_correct_processors is None:
+            all_correct_processors = self._correct_snapshot = tuple(self._correct_processors.values())
+        sender = message.sender
+        copies = len(all_correct_processors) - (sender.id in self._correct_processors)
+        self._sent_total.inc(Message.TYPE_NAMES[message.type], amount=copies)
+        self._processor_sent_total.inc(sender.id, amount=copies)
+        sent_at = self._scheduler.now()
+        self._transport.send(message, sent_at)
+        if self._recorder is not None:
+            self._recorder.sent(message)
+        if self._batch_tick is not None:
+            self._broadcast_batched(message, [p for p in all_correct_processors if p is not sender], sent_at)
+            return
         for processor in all_correct_processors:
-            delay = random.random() * self._broadcast_delay
-            t = Timer(delay, self._send_message_to, args=(message, processor))
-            t.start()
+            if processor is sender:
+                continue
+            delay = self._random.random() * self._broadcast_delay
+            self._scheduler.call_later(delay, self._send_message_to, message, processor, sent_at, 'broadcast',
+                                       self._broadcast_delay)
+
+    def _broadcast_batched(self, message, receivers, sent_at):
+        # Ticks are counted from time 0, so copies of different broadcasts due in the same tick share its event. A copy
+        # is delivered at the start of its tick, never later than its drawn delay, so the delay bound still holds.
+        first = sent_at / self._batch_tick
+        ticks = self._broadcast_delay / self._batch_tick
+        if self._numpy_random is not None:
+            receiver_ticks = (first + self._numpy_random.random(len(receivers)) * ticks).astype(int).tolist()
+        else:
+            receiver_ticks = [int(first + self._random.random() * ticks) for _ in receivers]
+        new_ticks = []
+        with self._tick_lock:
+            batches = self._tick_batches
+            for processor, tick in zip(receivers, receiver_ticks):
+                copies = batches.get(tick)
+                if copies is None:
+                    copies = batches[tick] = []
+                    new_ticks.append(tick)
+                copies.append((message, processor, sent_at))
+        now = self._scheduler.now()
+        for tick in new_ticks:
+            self._scheduler.call_later(max(tick * self._batch_tick - now, 0), self._deliver_tick, tick)
+
+    def deliver_remote(self, message_id, msg_type, sender, receiver_id, sent_at, content):
+        """Delivers a message that arrived from another process to the local processors it is addressed to
+
+        The transport calls this for every message it receives. A broadcast, with no receiver_id, goes to every local
+        correct processor; each copy is delayed like a local one, on top of the time it spent on the wire.
+        """
+        message = Message(sender, self, msg_type, message_id)
+        message.content = content
+        if receiver_id is not None:
+            receiver = self._all_processors.get(receiver_id)
+            if receiver is not None and receiver.status != Processor.CRASHED:
+                delay = self._random.random() * self._datagram_delay
+                self._scheduler.call_later(delay, self._send_message_to, message, receiver, sent_at, 'datagram',
+                                           self._datagram_delay)
+            return
+        message.freeze()
+        receivers = self._correct_processors.values()
+        self._sent_total.inc(Message.TYPE_NAMES[msg_type], amount=len(receivers))
+        self._processor_sent_total.inc(sender.id, amount=len(receivers))
+        for processor in receivers:
+            delay = self._random.random() * self._broadcast_delay
+            self._scheduler.call_later(delay, self._send_message_to, message, processor, sent_at, 'broadcast',
+                                       self._broadcast_delay)
 
     def close(self):
-        for processor in self._all_processors:
+        for processor in self.processors:
             processor.crash()
             del processor
+        self._transport.close()
+        if self._recorder is not None:
+            self._recorder.close()
         del self
 
+    def timing_report(self):
+        """Returns the scheduler's backlog and lateness, with the worst lateness also relative to each delay bound
+
+        Every report has the backlog, mean_lateness and max_lateness keys and the two ratios. A scheduler that does
+        not measure lateness, like the ThreadScheduler, or keeps no statistics at all, like the AsyncioScheduler,
+        reports None for what it does not know.
+        """
+        report = {'backlog': None, 'mean_lateness': None, 'max_lateness': None}
+        if hasattr(self._scheduler, 'stats'):
+            report.update(self._scheduler.stats())
+        max_lateness = report['max_lateness']
+        for kind, bound in (('broadcast', self._broadcast_delay), ('datagram', self._datagram_delay)):
+            report[f'max_lateness_over_{kind}_delay'] = None if max_lateness is None else max_lateness / bound
+        return report
+
     def find_processor(self, processor_id):
-        for processor in self.processors:
-            if processor.id == processor_id:
-                return processor
-        return None
+        """Returns the processor with the given id, a stand-in if another process hosts it, None if there is none"""
+        processor = self._all_processors.get(processor_id)
+        if processor is None:
+            return self._transport.remote(processor_id)
+        return processor
 
     def _assert_processor_registered(self, processor):
-        assert processor in self._all_processors, f"Processor(id={processor.id}) not registered in this channel"
+        assert processor.id in self._all_processors, f"Processor(id={processor.id}) not registered in this channel"
 
     @property
     def broadcast_delay(self):
@@ -94,9 +440,73 @@ class Channel:
     def datagram_delay(self):
         return self._datagram_delay
 
+    @property
+    def random(self):
+        return self._random
+
+    @property
+    def sent_counts(self):
+        """Returns a dict with the number of message copies sent so far for each message type"""
+        return {msg_type: self._sent_total.value(name) for msg_type, name in Message.TYPE_NAMES.items()}
+
+    def delay_ratio(self, kind):
+        """Returns the mean delivery delay of the given kind, 'broadcast' or 'datagram', divided by its bound
+
+        Returns:
+            A (mean ratio, deliveries) pair, the mean is None before the first delivery.
+        """
+        count = self._delay_ratio.count(kind)
+        return (self._delay_ratio.sum(kind) / count if count else None), count
+
+    def detection_latency(self):
+        """Returns the mean time from a crash to the last correct view dropping the crashed processor
+
+        Returns:
+            A (mean seconds, detected crashes) pair, the mean is None before the first crash is detected.
+        """
+        count = self._detection_seconds.count()
+        return (self._detection_seconds.sum() / count if count else None), count
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def changes(self):
+        return self._changes
+
+    @property
+    def snapshot(self):
+        """Returns a consistent GroupSnapshot of every processor's state, safe to read from any thread"""
+        return self._changes.snapshot()
+
+    @property
+    def recorder(self):
+        return self._recorder
+
+    @property
+    def batch_tick(self):
+        return self._batch_tick
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def profiler(self):
+        return self._profiler
+
     @property
     def processors(self):
-        return self._all_processors
+        return list(self._all_processors.values())
 
     def __contains__(self, item):
-        return item in self._all_processors
+        return isinstance(item, Processor) and item.id in self._all_processors
+
+
+def _message_type(message, *_):
+    return message.type
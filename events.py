@@ -0,0 +1,14 @@
+import logging
+
+logger = logging.getLogger('membership')
+
+
+def log_event(level, event, **fields):
+    """Logs a structured protocol event
+
+    Call sites check logger.isEnabledFor(level) before calling, so an event whose level is disabled costs one cached
+    level check and never builds its fields. The event name and fields are also attached to the log record as the
+    event and fields attributes for structured handlers.
+    """
+    text = ' '.join(f'{key}={value}' for key, value in fields.items())
+    logger.log(level, '%s %s', event, text, extra={'event': event, 'fields': fields})
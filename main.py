@@ -2,10 +2,12 @@ from channel import Channel
 from message import Message
 from processor import Processor
 import datetime
+import logging
 import time
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     broadcast_delay, datagram_delay = 1, 1
     max_clock_sync_error = 1
     c = Channel(broadcast_delay, datagram_delay)
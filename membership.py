@@ -0,0 +1,190 @@
+import bisect
+
+
+class MemberView:
+    """An immutable membership view stored as an int bitmask
+
+    Bit i of the mask is set when the processor with id i is a member. Because the mask is a Python int, equality,
+    union and popcount run word by word in C, and a view can be shipped in a message without copying: it never changes
+    once created, every update returns a new view.
+
+    Attributes:
+        _bits: A int whose set bits are the ids of the members
+        _ring: The RingIndex of this view, built the first time it is needed
+    """
+
+    __slots__ = ('_bits', '_ring')
+
+    def __init__(self, ids=()):
+        """Inits the view with the given processor ids"""
+        bits = 0
+        for processor_id in ids:
+            bits |= 1 << processor_id
+        object.__setattr__(self, '_bits', bits)
+        object.__setattr__(self, '_ring', None)
+
+    @classmethod
+    def from_bits(cls, bits):
+        """Returns a view whose members are the set bits of the given int"""
+        view = cls.__new__(cls)
+        object.__setattr__(view, '_bits', bits)
+        object.__setattr__(view, '_ring', None)
+        return view
+
+    def with_member(self, processor_id):
+        """Returns a new view that also contains the given processor id"""
+        return MemberView.from_bits(self._bits | 1 << processor_id)
+
+    def without_member(self, processor_id):
+        """Returns a new view that does not contain the given processor id"""
+        return MemberView.from_bits(self._bits & ~(1 << processor_id))
+
+    def union(self, other):
+        """Returns a new view with the members of both views"""
+        return MemberView.from_bits(self._bits | other._bits)
+
+    @property
+    def bits(self):
+        return self._bits
+
+    @property
+    def ring(self):
+        """Returns the RingIndex of this view
+
+        The index is built once and cached; since the view never changes, it only has to be rebuilt when a processor
+        moves to a different view.
+        """
+        if self._ring is None:
+            object.__setattr__(self, '_ring', RingIndex(self))
+        return self._ring
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __reduce__(self):
+        return MemberView.from_bits, (self._bits,)
+
+    def __contains__(self, processor_id):
+        return processor_id >= 0 and self._bits >> processor_id & 1 == 1
+
+    def __iter__(self):
+        """Yields the member ids in ascending order"""
+        bits = self._bits
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def __len__(self):
+        return self._bits.bit_count()
+
+    def __bool__(self):
+        return self._bits != 0
+
+    def __eq__(self, other):
+        if type(other) == MemberView:
+            return other._bits == self._bits
+        return False
+
+    def __hash__(self):
+        return hash(self._bits)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('MemberView is immutable')
+
+    def __repr__(self):
+        return f'MemberView({[*self]})'
+
+
+class RingIndex:
+    """The members of a view arranged as a ring in ascending id order
+
+    The attendance-list and neighbor-surveillance protocols pass messages around this ring, and the hierarchical
+    protocol along a tree laid over it. Position, successor and predecessor queries for members are O(1) dict
+    lookups, and O(log N) bisections for ids outside the view.
+
+    Attributes:
+        _ids: A tuple of the member ids in ascending order
+        _positions: A dict mapping each member id to its position in _ids
+    """
+
+    __slots__ = ('_ids', '_positions')
+
+    def __init__(self, ids):
+        """Inits the ring from member ids given in ascending order"""
+        self._ids = tuple(ids)
+        self._positions = {processor_id: pos for pos, processor_id in enumerate(self._ids)}
+
+    def position(self, processor_id):
+        """Returns the position of the given member on the ring, raises ValueError if it is not a member"""
+        pos = self._positions.get(processor_id)
+        if pos is None:
+            raise ValueError(f'{processor_id} is not in the ring')
+        return pos
+
+    def successor(self, processor_id):
+        """Returns the id of the member after the given id on the ring, wrapping around at the end"""
+        pos = self._positions.get(processor_id)
+        if pos is None:
+            pos = bisect.bisect_right(self._ids, processor_id) - 1
+        return self._ids[(pos + 1) % len(self._ids)]
+
+    def predecessor(self, processor_id):
+        """Returns the id of the member before the given id on the ring, wrapping around at the start"""
+        pos = self._positions.get(processor_id)
+        if pos is None:
+            pos = bisect.bisect_left(self._ids, processor_id)
+        return self._ids[pos - 1]
+
+    def attendance_hops(self, processor_id, tokens):
+        """Returns when an attendance token reaches the given member if tokens of them circulate at once
+
+        The ring is split into tokens segments of nearly equal length. The first member of each segment, its head,
+        starts a token that travels through the segment and is taken out of circulation by the head of the next one.
+
+        Returns:
+            A (hops, is head) pair with the number of datagram hops after the check-in the member receives a token,
+            for a head the token of the segment before its own, and whether the member is a segment head.
+        """
+        pos = self.position(processor_id)
+        size = len(self._ids)
+        tokens = max(1, min(tokens, size))
+        segment = ((pos + 1) * tokens - 1) // size
+        head = segment * size // tokens
+        if pos != head:
+            return pos - head, False
+        previous_head = (segment - 1) % tokens * size // tokens
+        return (head if segment else size) - previous_head, True
+
+    def tree_links(self, processor_id, fanout):
+        """Returns where the given member sits when the ring is laid out as a tree with the given fanout
+
+        The tree is stored like a heap: position 0 is the root and the children of position p are the positions
+        fanout * p + 1 to fanout * p + fanout.
+
+        Returns:
+            A (parent id, children ids, depth, height) tuple, the parent is None for the root. The depth counts the
+            hops up to the root, the height the hops down to the deepest leaf below the member.
+        """
+        pos = self.position(processor_id)
+        size = len(self._ids)
+        parent = self._ids[(pos - 1) // fanout] if pos else None
+        first_child = fanout * pos + 1
+        children = self._ids[first_child:min(first_child + fanout, size)]
+        depth = 0
+        p = pos
+        while p:
+            p = (p - 1) // fanout
+            depth += 1
+        height = 0
+        p = first_child
+        while p < size:
+            p = fanout * p + 1
+            height += 1
+        return parent, children, depth, height
+
+    def __getitem__(self, pos):
+        return self._ids[pos]
+
+    def __len__(self):
+        return len(self._ids)
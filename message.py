@@ -11,23 +11,26 @@ class Message:
                    is intended for broadcasting.
         _channel: A Channel represents the channel that the message will be delivered through
         _msg_type: A int represents the type of this message
+        _frozen: A bool indicating whether the message is shared by several receivers and can no longer be changed
     """
 
     NEW_GROUP = 1
     PRESENT = 2
     ATTENDANCE_LIST = 3
     NEIGHBORHOOD = 4
-    ID_COUNT = 0
+    DIGEST = 5
+    DIGEST_ACK = 6
+    TYPE_NAMES = {NEW_GROUP: 'new_group', PRESENT: 'present', ATTENDANCE_LIST: 'attendance_list',
+                  NEIGHBORHOOD: 'neighborhood', DIGEST: 'digest', DIGEST_ACK: 'digest_ack'}
 
-    def __init__(self, sender, channel, msg_type=NEW_GROUP):
-        self._message_id = Message.ID_COUNT
+    def __init__(self, sender, channel, msg_type=NEW_GROUP, message_id=None):
+        self._message_id = channel.next_message_id() if message_id is None else message_id
         self._sender = sender
         self._receiver = None
         self._channel = channel
         self._msg_type = msg_type
         self._content = None
-
-        Message.ID_COUNT += 1
+        self._frozen = False
 
     @property
     def id(self):
@@ -47,6 +50,7 @@ class Message:
 
     @receiver.setter
     def receiver(self, new_receiver):
+        self._assert_not_frozen()
         self._receiver = new_receiver
 
     @property
@@ -55,8 +59,16 @@ class Message:
 
     @content.setter
     def content(self, new_content):
+        self._assert_not_frozen()
         self._content = new_content
 
+    def freeze(self):
+        """Makes the message read-only, it is called before the message is shared by several receivers"""
+        self._frozen = True
+
+    def _assert_not_frozen(self):
+        assert not self._frozen, f"Message(id={self.id}) is read-only once it has been broadcast"
+
     def __str__(self):
         return f'msg: {self.id}, type: {self.type}, sender: {self.sender.id}, content: {self.content}'
 
@@ -0,0 +1,143 @@
+import bisect
+import threading
+
+
+class Counter:
+    """A monotonically increasing metric, optionally split by label values
+
+    Attributes:
+        name: A str with the metric name
+        help: A str describing the metric
+        labels: A tuple of label names
+        _values: A dict mapping a tuple of label values to the current count
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """Adds amount to the count of the given label values"""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        """Returns a list of (suffix, label dict, value) tuples for rendering"""
+        return [('', dict(zip(self.labels, key)), value) for key, value in list(self._values.items())]
+
+
+class Gauge:
+    """A metric whose value is read from a function each time it is scraped
+
+    Attributes:
+        name: A str with the metric name
+        help: A str describing the metric
+        labels: A tuple of label names
+        _read: A function returning a dict mapping a tuple of label values to the current value
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._read = read
+
+    def samples(self):
+        return [('', dict(zip(self.labels, key)), value) for key, value in self._read().items()]
+
+
+class Histogram:
+    """A metric counting observations into cumulative buckets, optionally split by label values
+
+    Attributes:
+        name: A str with the metric name
+        help: A str describing the metric
+        labels: A tuple of label names
+        buckets: A tuple of ascending bucket upper bounds, +Inf is implied
+        _values: A dict mapping a tuple of label values to a [bucket counts, sum, count] list
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Records one observation of value for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *label_values):
+        entry = self._values.get(label_values)
+        return 0 if entry is None else entry[2]
+
+    def sum(self, *label_values):
+        entry = self._values.get(label_values)
+        return 0.0 if entry is None else entry[1]
+
+    def samples(self):
+        samples = []
+        for key, (bucket_counts, total, count) in list(self._values.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """A collection of metrics that renders them in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Adds the metric to the registry and returns it"""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                label_text = f'{{{label_text}}}' if label_text else ''
+                lines.append(f'{metric.name}{suffix}{label_text} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
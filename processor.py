@@ -1,9 +1,8 @@
-import random
-import time
-import datetime
+import logging
 
+from events import log_event, logger
+from membership import MemberView
 from message import Message
-from threading import Timer
 
 
 class Processor:
@@ -17,50 +16,92 @@ class Processor:
 
     Attributes:
         _id: A int indicating the id of this Processor
-        _current_group: A str indicating the current group the processor belongs to
+        _current_group: The V timestamp identifying the current group the processor belongs to, 0 if it has none
         _status: A int constant indicating the status of the Processor
-        _membership: A list contains the Processor's view of its memberships in the _current_group
+        _membership: A MemberView contains the Processor's view of its memberships in the _current_group
         _channel: A Channel object where the processor is attached to
         _clock_diff: A float representing the clock synchronization error of this Processor clock from the master clock
-        _check_timer: A timer object that schedules sending the present message
+        _check_timer: A timer handle from the channel's scheduler that schedules sending the present message
         _check_in_period: A float indicates the check in period for the processor
+        _join_coalescing: A bool indicating whether a detected failure only starts a re-formation if no other
+                          processor that detected it started one first
+        _pending_join: A timer handle for a re-formation held back by join coalescing, None if there is none
+        _attendance_tokens: A int indicating how many attendance lists circulate at once under the attendance-list
+                            protocol, each through its own segment of the ring
+        _digest_round: The V of the check-in whose digest the processor is collecting under the hierarchical protocol
+        _digest: A MemberView of the processors reported alive in _digest_round by this processor's subtree
+        _digest_children: A MemberView of the children whose digest has arrived in _digest_round
+        _digest_child_count: A int indicating how many children this processor has in the tree of _digest_round
+        _digest_started: A bool indicating whether this processor's own check-in of _digest_round has begun
+        _digest_sent: A bool indicating whether the digest of _digest_round has been sent up the tree, or checked at
+                      the root
+        _digest_acked: The V of the latest check-in the root has acknowledged
     """
 
     NORMAL = 1
     CRASHED = -1
-    ID_COUNT = 1
 
     PERIODIC_BROADCAST_PROTOCOL = 10
     ATTENDANCE_LIST_PROTOCOL = 11
     NEIGHBOR_SURVEILLANCE_PROTOCOL = 12
+    HIERARCHICAL_PROTOCOL = 13
 
-    def __init__(self, channel, max_clock_sync_error, check_in_period, check_in_policy):
+    HIERARCHY_FANOUT = 4
+
+    JOIN_MANUAL = 'manual'
+    JOIN_MEMBERSHIP_CHECK = 'membership_check'
+    JOIN_ATTENDANCE_LIST = 'attendance_list'
+    JOIN_NEIGHBOR = 'neighbor'
+    JOIN_HIERARCHY = 'hierarchy'
+    JOIN_RECOVERY = 'recovery'
+
+    def __init__(self, channel, max_clock_sync_error, check_in_period, check_in_policy, join_coalescing=False,
+                 attendance_tokens=1):
         """ Inits the Processor with given max clock synchronization error """
-        self._id = Processor.ID_COUNT
+        self._id = channel.next_processor_id()
         self._current_group = 0
         self._status = Processor.NORMAL
-        self._membership = set()
+        self._membership = MemberView()
         self._channel = channel
         self._max_clock_sync_error = max_clock_sync_error
-        self._clock_diff = (random.random() - 0.5) * max_clock_sync_error
+        self._clock_diff = (channel.random.random() - 0.5) * max_clock_sync_error
         self._check_timer = None
         self._check_member_timer = None
         self._check_in_period = check_in_period
-        self._check_in_ids_count = set()
+        self._check_in_ids_count = MemberView()
         self._protocol = check_in_policy
         self._attendance_list_checked = False
         self._neighbor_present = False
-        Processor.ID_COUNT += 1
-
-    def init_join(self):
-        """Initializes the join process, broadcasting the new-group message to all correct processors."""
-        print(f'processor {self.id} init group')
+        self._join_coalescing = join_coalescing
+        self._pending_join = None
+        self._attendance_tokens = attendance_tokens
+        self._digest_round = 0
+        self._digest = MemberView()
+        self._digest_children = MemberView()
+        self._digest_child_count = 0
+        self._digest_started = False
+        self._digest_sent = False
+        self._digest_acked = 0
+
+    def init_join(self, cause=JOIN_MANUAL):
+        """Initializes the join process, broadcasting the new-group message to all correct processors.
+
+        The cause is one of the JOIN_* constants and is only used for metrics and the event log.
+        """
+        self._channel.record_init_join(cause, self)
+        if logger.isEnabledFor(logging.INFO):
+            log_event(logging.INFO, 'init_join', processor=self.id, cause=cause)
         self._cancel_all_timer()
-        self._membership = set()
+        self._cancel_pending_join()
         m = self._channel.create_message(self, Message.NEW_GROUP)
         broadcast_delay = self._channel.broadcast_delay
-        m.content = self.clock + datetime.timedelta(seconds=broadcast_delay + self._max_clock_sync_error)
+        V = self.clock + broadcast_delay + self._max_clock_sync_error
+        m.content = V
+        # The initiator joins its own group, so it checks in alongside the processors that accept the proposal
+        self._set_view(MemberView((self.id,)), V)
+        self._check_in_ids_count = MemberView()
         self._channel.broadcast(m)
+        self._schedule_next_check_in(V)
 
     def send(self, target):
         """Sends the given message to target processor"""
@@ -75,64 +116,166 @@ class Processor:
         self._channel.broadcast(m)
 
     def schedule_broadcast(self, V):
-        if self.clock <= V:
+        if self._status == Processor.CRASHED:
+            # A crashed processor must never re-arm its check-in timers
+            return
+        # Timers never fire early, so only a check-in that is more than a whole period late is skipped
+        if self.clock <= V + self._check_in_period:
             if self._protocol == self.PERIODIC_BROADCAST_PROTOCOL:
-                print(f'Send check in present message, id={self.id}')
+                if logger.isEnabledFor(logging.DEBUG):
+                    log_event(logging.DEBUG, 'check_in', processor=self.id, V=V)
                 self.broadcast_present_msg(V)
-                self._check_member_timer = Timer(self._channel.broadcast_delay + self._max_clock_sync_error,
-                                                 self._check_membership)
-                self._check_member_timer.start()
-                self._check_timer = Timer(self._check_in_period, self.schedule_broadcast,
-                                          args=[V + datetime.timedelta(seconds=self._check_in_period)])
-                self._check_timer.start()
+                self._check_member_timer = self._call_later(
+                    self._channel.broadcast_delay + self._max_clock_sync_error, self._check_membership)
+                self._schedule_next_check_in(V)
             elif self._protocol == self.ATTENDANCE_LIST_PROTOCOL:
                 self._cancel_all_timer()
-                sorted_members = sorted([*self._membership])
-                pos = sorted_members.index(self.id)
-                if pos == 0:
-                    # The processor is the one send the attendance list
+                ring = self._membership.ring
+                hops, is_head = ring.attendance_hops(self.id, self._attendance_tokens)
+                if is_head:
+                    # The processor is the one send the attendance list of its segment
                     m = self._channel.create_message(self, Message.ATTENDANCE_LIST)
-                    m.receiver = self._channel.find_processor(sorted_members[1 % len(sorted_members)])
+                    m.receiver = self._channel.find_processor(ring.successor(self.id))
                     self._channel.send_message(m)
-                    pos = len(sorted_members)
-
-                self._check_member_timer = Timer(pos * self._channel.datagram_delay,
-                                                 self._check_attendance_list)
-                self._check_member_timer.start()
-                self._check_timer = Timer(self._check_in_period, self.schedule_broadcast,
-                                          args=[V + datetime.timedelta(seconds=self._check_in_period)])
-                self._check_timer.start()
+
+                self._check_member_timer = self._call_later(
+                    hops * self._channel.datagram_delay + self._max_clock_sync_error, self._check_attendance_list)
+                self._schedule_next_check_in(V)
             elif self._protocol == self.NEIGHBOR_SURVEILLANCE_PROTOCOL:
-                sorted_numbers = sorted([*self._membership])
-                pos = sorted_numbers.index(self.id)
-                next_pos = (pos + 1) % len(sorted_numbers)
                 m = self._channel.create_message(self, Message.NEIGHBORHOOD)
-                m.receiver = self._channel.find_processor(sorted_numbers[next_pos])
+                m.receiver = self._channel.find_processor(self._membership.ring.successor(self.id))
                 self._channel.send_message(m)
 
-                self._check_member_timer = Timer(self._channel.datagram_delay + self._max_clock_sync_error, self._check_neighbor_present)
-                self._check_member_timer.start()
+                self._check_member_timer = self._call_later(
+                    self._channel.datagram_delay + self._max_clock_sync_error, self._check_neighbor_present)
 
-                self._check_timer = Timer(self._check_in_period, self.schedule_broadcast,
-                                          args=[V + datetime.timedelta(seconds=self._check_in_period)])
-                self._check_timer.start()
+                self._schedule_next_check_in(V)
+            elif self._protocol == self.HIERARCHICAL_PROTOCOL:
+                self._begin_digest_round(V)
+                self._schedule_next_check_in(V)
 
     def _check_attendance_list(self):
         if not self._attendance_list_checked:
-            print('attendance check failed, init join')
-            self.init_join()
+            if logger.isEnabledFor(logging.INFO):
+                log_event(logging.INFO, 'attendance_check_failed', processor=self.id)
+            self._request_join(Processor.JOIN_ATTENDANCE_LIST, self._membership)
         else:
             self._attendance_list_checked = False
 
     def _check_neighbor_present(self):
         if not self._neighbor_present:
-            print('neighbor failed')
-            self.init_join()
+            if logger.isEnabledFor(logging.INFO):
+                log_event(logging.INFO, 'neighbor_failed', processor=self.id)
+            # Only the predecessor of a crashed processor notices, so there is nobody to coalesce with
+            self._request_join(Processor.JOIN_NEIGHBOR, MemberView((self.id,)))
         else:
             self._neighbor_present = False
 
+    def _begin_digest_round(self, V):
+        """Starts the check-in V of the hierarchical protocol
+
+        The ring is laid out as a tree with HIERARCHY_FANOUT children per member. Leaves send a DIGEST with their
+        own id to their parent; every other member waits until the digests of all its children have arrived, or
+        are overdue, and sends the union of them and its own id on to its parent. The root compares the digest it
+        ends up with to its view and re-forms the group if anyone is missing, then sends a DIGEST_ACK down the tree.
+        A member whose ack is overdue has lost an ancestor and re-forms the group itself.
+
+        Every member handles at most HIERARCHY_FANOUT + 1 messages each way per period, and a failure is noticed
+        within about twice the tree height, O(log N), datagram delays plus clock errors.
+        """
+        if self._digest_round != V:
+            self._reset_digest_round(V)
+        self._digest_started = True
+        _, children, _, height = self._membership.ring.tree_links(self.id, self.HIERARCHY_FANOUT)
+        self._digest_child_count = len(children)
+        if len(self._digest_children) < self._digest_child_count:
+            # Children check in up to one clock error later and each level below may wait out its own deadline
+            deadline = V + height * (self._channel.datagram_delay + self._max_clock_sync_error)
+            self._check_member_timer = self._call_later(max(deadline - self.clock, 0), self._send_digest, V)
+        else:
+            self._send_digest(V)
+
+    def _reset_digest_round(self, V):
+        self._digest_round = V
+        self._digest = MemberView((self.id,))
+        self._digest_children = MemberView()
+        self._digest_child_count = 0
+        self._digest_started = False
+        self._digest_sent = False
+
+    def _send_digest(self, V):
+        """Passes the digest of check-in V up the tree, or at the root checks it and acknowledges it down the tree"""
+        if self._digest_sent or self._digest_round != V:
+            return
+        self._digest_sent = True
+        if self._check_member_timer is not None:
+            self._check_member_timer.cancel()
+        ring = self._membership.ring
+        parent, children, depth, _ = ring.tree_links(self.id, self.HIERARCHY_FANOUT)
+        if parent is None:
+            self._send_digest_acks(V, children)
+            if self._digest != self._membership:
+                if logger.isEnabledFor(logging.INFO):
+                    missing = MemberView.from_bits(self._membership.bits & ~self._digest.bits)
+                    log_event(logging.INFO, 'digest_check_failed', processor=self.id, missing=[*missing])
+                self._request_join(Processor.JOIN_HIERARCHY, MemberView((self.id,)))
+            return
+        m = self._channel.create_message(self, Message.DIGEST)
+        m.receiver = self._channel.find_processor(parent)
+        m.content = (V, self._digest)
+        self._channel.send_message(m)
+
+        # The root acknowledges once its own deadline has passed, then the ack takes one hop per level to get here
+        tree_height = ring.tree_links(ring[0], self.HIERARCHY_FANOUT)[3]
+        deadline = V + (tree_height + depth + 1) * (self._channel.datagram_delay + self._max_clock_sync_error)
+        self._check_member_timer = self._call_later(max(deadline - self.clock, 0), self._check_digest_ack, V)
+
+    def _send_digest_acks(self, V, children):
+        for child in children:
+            m = self._channel.create_message(self, Message.DIGEST_ACK)
+            m.receiver = self._channel.find_processor(child)
+            m.content = V
+            self._channel.send_message(m)
+
+    def _check_digest_ack(self, V):
+        if self._digest_acked >= V or self._digest_round != V:
+            return
+        ring = self._membership.ring
+        parent = ring.tree_links(self.id, self.HIERARCHY_FANOUT)[0]
+        if parent is None:
+            # The view changed since the digest was sent and this processor is the root now, nobody acks it
+            return
+        if logger.isEnabledFor(logging.INFO):
+            log_event(logging.INFO, 'digest_ack_missing', processor=self.id, V=V)
+        # Every child of the lost ancestor notices at about the same time, so they coalesce with their siblings
+        siblings = ring.tree_links(parent, self.HIERARCHY_FANOUT)[1]
+        self._request_join(Processor.JOIN_HIERARCHY, MemberView(siblings))
+
+    def _handle_digest_msg(self, msg):
+        V, digest = msg.content
+        if V < self._digest_round:
+            # the digest belongs to a check-in that is already over
+            return
+        if V > self._digest_round:
+            # a child checked in before this processor did
+            self._reset_digest_round(V)
+        self._digest = self._digest | digest
+        self._digest_children = self._digest_children.with_member(msg.sender.id)
+        if self._digest_started and len(self._digest_children) >= self._digest_child_count:
+            self._send_digest(V)
+
+    def _handle_digest_ack_msg(self, msg):
+        V = msg.content
+        if V <= self._digest_acked:
+            return
+        self._digest_acked = V
+        if self.id in self._membership:
+            self._send_digest_acks(V, self._membership.ring.tree_links(self.id, self.HIERARCHY_FANOUT)[1])
+
     def receive(self, msg):
-        """Handles the message receiving based on message type."""
+        """Handles the message receiving based on message type, messages arriving after a crash are dropped."""
+        if self._status == Processor.CRASHED:
+            return
         if msg.type == Message.NEW_GROUP:
             self._handle_new_group_msg(msg)
         elif msg.type == Message.PRESENT:
@@ -141,18 +284,49 @@ class Processor:
             self._handle_attendance_list_msg(msg)
         elif msg.type == Message.NEIGHBORHOOD:
             self._handle_neighbor_present(msg)
+        elif msg.type == Message.DIGEST:
+            self._handle_digest_msg(msg)
+        elif msg.type == Message.DIGEST_ACK:
+            self._handle_digest_ack_msg(msg)
         return
 
     def crash(self):
         """Crashes this processor, all timer will be stopped"""
         self._status = Processor.CRASHED
-        self._current_group = 0
-        self._membership = set()
-        self._check_in_ids_count = set()
+        self._channel.update_status(self)
+        self._set_view(MemberView(), 0)
+        self._check_in_ids_count = MemberView()
         if self._check_timer is not None:
             self._check_timer.cancel()
         if self._check_member_timer is not None:
             self._check_member_timer.cancel()
+        self._cancel_pending_join()
+
+    def recover(self):
+        """Restarts a crashed processor, which re-forms the group so that the others let it back in"""
+        if self._status != Processor.CRASHED:
+            return
+        self._status = Processor.NORMAL
+        self._channel.update_status(self)
+        self.init_join(Processor.JOIN_RECOVERY)
+
+    def _set_view(self, view, group=None):
+        """Replaces the membership view, and the group if one is given, and tells the channel when either changed"""
+        old_view = self._membership
+        old_group = self._current_group
+        self._membership = view
+        if group is not None:
+            self._current_group = group
+        if view != old_view or self._current_group != old_group:
+            self._channel.view_changed(self, old_view, view)
+
+    def _schedule_next_check_in(self, V):
+        """Schedules the next check-in for when this processor's clock reads V + check_in_period"""
+        self._check_timer = self._call_later(max(self._compute_time_diff(V), 0), self.schedule_broadcast,
+                                             V + self._check_in_period)
+
+    def _call_later(self, delay, callback, *args):
+        return self._channel.schedule_timer(self, delay, callback, *args)
 
     def _cancel_all_timer(self):
         if self._check_timer is not None:
@@ -161,55 +335,103 @@ class Processor:
             self._check_member_timer.cancel()
 
     def _check_membership(self):
-        self._check_in_ids_count.add(self.id)
-        if self._check_in_ids_count != self._membership:
-            self._check_in_ids_count = set()
-            self.init_join()
-        self._check_in_ids_count = set()
+        heard = self._check_in_ids_count.with_member(self.id)
+        self._check_in_ids_count = MemberView()
+        if heard != self._membership:
+            if logger.isEnabledFor(logging.INFO):
+                log_event(logging.INFO, 'membership_check_failed', processor=self.id)
+            self._request_join(Processor.JOIN_MEMBERSHIP_CHECK, heard)
+
+    def _request_join(self, cause, detectors):
+        """Starts a re-formation after a detected failure, held back by join coalescing unless this processor leads
+
+        Without join coalescing every processor that detects a failure starts its own re-formation at once. With it,
+        the detectors, a MemberView of the processors expected to detect the same failure, take turns in id order:
+        the first starts right away and each later one waits one more broadcast delay plus twice the clock error,
+        long enough for the NEW_GROUP message of the one before to arrive. A processor that has joined a newer group
+        by the time its turn comes drops its own re-formation, so a failure noticed by the whole group usually leads
+        to a single NEW_GROUP broadcast instead of one per survivor.
+        """
+        rank = detectors.ring.position(self.id) if self._join_coalescing else 0
+        if rank == 0:
+            self.init_join(cause)
+            return
+        if self._pending_join is None:
+            delay = rank * (self._channel.broadcast_delay + 2 * self._max_clock_sync_error)
+            self._pending_join = self._call_later(delay, self._pending_join_due, cause, self._current_group)
+
+    def _pending_join_due(self, cause, group):
+        self._pending_join = None
+        if self._current_group == group:
+            self.init_join(cause)
+            return
+        self._channel.record_join_suppressed(cause)
+        if logger.isEnabledFor(logging.INFO):
+            log_event(logging.INFO, 'join_suppressed', processor=self.id, cause=cause, group=self._current_group)
+
+    def _cancel_pending_join(self):
+        if self._pending_join is not None:
+            self._pending_join.cancel()
+            self._pending_join = None
 
     def _handle_new_group_msg(self, msg):
-        if self.clock > msg.content:
+        V = msg.content
+        if self.clock > V:
             # the message is outdated
             return
+        if self._current_group and V < self._current_group:
+            # the processor has already joined a newer group
+            return
         if self._check_timer is not None:
             self._check_timer.cancel()
         if self._check_member_timer is not None:
             self._check_member_timer.cancel()
         sender_id = msg.sender.id
-        self._membership = {self.id, sender_id}
-        V = msg.content
+        if V == self._current_group:
+            # A present message of this group arrived before the new-group message, keep what it taught us
+            self._set_view(self._membership.with_member(sender_id))
+        else:
+            self._set_view(MemberView((self.id, sender_id)), V)
+        self._check_in_ids_count = MemberView()
         self.broadcast_present_msg(V)
-        self._check_timer = Timer(self._check_in_period + self._channel.broadcast_delay, self.schedule_broadcast,
-                                  args=[V + datetime.timedelta(seconds=self._check_in_period)])
-        self._check_timer.start()
+        self._schedule_next_check_in(V)
 
     def _handle_present_msg(self, msg):
         V, sender_ids = msg.content
+        if self._current_group and V < self._current_group:
+            # the message belongs to a group the processor has already left
+            return
         if sender_ids != self._membership:
-            self._membership = sender_ids
-            self._membership.add(self.id)
-            self._current_group = V
-            self._check_in_ids_count = set()
+            if self._current_group and V == self._current_group:
+                # Both views belong to the same group, so neither one has seen every member yet
+                sender_ids = sender_ids | self._membership
+            self._set_view(sender_ids.with_member(self.id), V)
+            self._check_in_ids_count = MemberView()
+            if self._protocol == self.HIERARCHICAL_PROTOCOL and self._digest_sent:
+                # The pending timer waits for an ack along the tree of the old view
+                if self._check_member_timer is not None:
+                    self._check_member_timer.cancel()
         else:
-            self._check_in_ids_count.add(msg.sender.id)
+            self._check_in_ids_count = self._check_in_ids_count.with_member(msg.sender.id)
 
     def _handle_attendance_list_msg(self, msg):
         self._attendance_list_checked = True
-        sorted_members = sorted(self.members)
-        pos = sorted_members.index(self.id)
-        receiver_id = sorted_members[(pos + 1) % len(sorted_members)]
-        msg.receiver = self._channel.find_processor(receiver_id)
-        print(
-            f'id={self.id} receive attendance list msg from {msg.sender.id} '
-            f'send attendance list msg to {msg.receiver.id}')
+        if msg.sender.id == self.id or self._membership.ring.attendance_hops(self.id, self._attendance_tokens)[1]:
+            # The list has gone all the way through its segment to the head of the next one, which started its own
+            return
+        msg.receiver = self._channel.find_processor(self._membership.ring.successor(self.id))
+        if logger.isEnabledFor(logging.DEBUG):
+            log_event(logging.DEBUG, 'attendance_list_hop', processor=self.id, origin=msg.sender.id,
+                      receiver=msg.receiver.id)
         self._channel.send_message(msg)
 
     def _handle_neighbor_present(self, msg):
         self._neighbor_present = True
-        print(f'id={self.id} receives neighbor present from {msg.sender.id}')
+        if logger.isEnabledFor(logging.DEBUG):
+            log_event(logging.DEBUG, 'neighbor_present', processor=self.id, neighbor=msg.sender.id)
 
     def _compute_time_diff(self, V):
-        diff = V.timestamp() + self._check_in_period - self.clock.timestamp()
+        diff = V + self._check_in_period - self.clock
         return diff
 
     """Class properties"""
@@ -226,8 +448,31 @@ class Processor:
 
     @group.setter
     def group(self, new_group):
-        assert type(new_group) == str
-        self._current_group = new_group
+        self._set_view(self._membership, new_group)
+
+    @property
+    def group_time(self):
+        """Returns the current group as a local datetime for display, None if the processor has no group"""
+        if not self._current_group:
+            return None
+        return self._channel.scheduler.to_datetime(self._current_group)
+
+    @property
+    def clock_error(self):
+        """Returns the clock synchronization error A of this processor, its clock reads H(t)+A"""
+        return self._clock_diff
+
+    @clock_error.setter
+    def clock_error(self, clock_diff):
+        # Only trace replays set the error, so a replayed processor reads the same clock as the recorded one
+        self._clock_diff = clock_diff
+
+    @property
+    def settings(self):
+        """Returns the (max clock sync error, check-in period, protocol, join coalescing, attendance tokens) tuple
+        the processor was created with"""
+        return (self._max_clock_sync_error, self._check_in_period, self._protocol, self._join_coalescing,
+                self._attendance_tokens)
 
     @property
     def status(self):
@@ -237,6 +482,12 @@ class Processor:
     @status.setter
     def status(self, new_status):
         self._status = new_status
+        self._channel.update_status(self)
+
+    @property
+    def view(self):
+        """Returns the membership view of this processor as an immutable MemberView"""
+        return self._membership
 
     @property
     def members(self):
@@ -244,18 +495,21 @@ class Processor:
 
     @property
     def clock(self):
-        """Returns the clock reading of this Processor
+        """Returns the clock reading of this Processor in seconds
 
-        The reading is computed as H(t)+A where H(t) is the standard time in current time zone
+        The reading is computed as H(t)+A where H(t) is the monotonic time of the channel's scheduler, so that it
+        follows the virtual clock in simulations and is not affected by adjustments of the wall clock. Use the
+        scheduler's to_datetime to display a reading.
         """
-        now = time.time()
-        tz = datetime.datetime.now(datetime.timezone.utc).astimezone().tzinfo
-        return datetime.datetime.fromtimestamp(now + self._clock_diff, tz=tz)
+        return self._channel.scheduler.now() + self._clock_diff
 
     def __eq__(self, other):
         if type(other) == Processor:
             return other.id == self.id
         return False
 
+    def __hash__(self):
+        return hash(self.id)
+
     def __str__(self):
-        return f'Processor {self.id}, group members: {self.members}'
+        return f'Processor {self.id}, group: {self.group_time}, group members: {self.members}'
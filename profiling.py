@@ -0,0 +1,159 @@
+import collections
+import threading
+import time
+
+from message import Message
+
+ProfileSample = collections.namedtuple('ProfileSample', ('stack', 'total_ns', 'self_ns', 'latency'))
+ProfileSample.__doc__ = """One profiled call: its frame names from the outermost, its time with and without the
+profiled calls it made, and for deliveries the seconds the message spent on its way, otherwise None"""
+
+# Pushed for a top-level call that is not sampled, so that the calls it makes are not sampled either
+_SKIPPED = object()
+
+
+class _Stack(threading.local):
+    def __init__(self):
+        self.frames = []
+
+
+class Profiler:
+    """Times the channel's send and deliver path and the processors' message handling, split by message type
+
+    A Channel created with a profiler wraps its create_message, send_message, broadcast and delivery methods, and the
+    receive method of each processor it registers, with wrap(). Each call is a frame named after the site and the
+    message type, like 'receive new_group' or 'broadcast present', and calls made inside it are nested frames, so a
+    NEW_GROUP handler's fan-out is attributed to it. A channel without a profiler wraps nothing, so the hooks cost
+    nothing at all when they are off.
+
+    Only one in every sample_every top-level calls is timed, together with all the calls it makes. Every timed call is
+    handed as a ProfileSample to each sink's record method, which may be called from several threads at once.
+
+    Attributes:
+        _sinks: A list of the sinks the samples are recorded to
+        _sample_every: A int, one in this many top-level calls is timed
+        _calls: A int counting the top-level calls, to pick the sampled ones
+        _stack: A thread-local holding the frames of the calls in progress on the current thread
+    """
+
+    def __init__(self, *sinks, sample_every=1):
+        self._sinks = list(sinks)
+        self._sample_every = sample_every
+        self._calls = 0
+        self._stack = _Stack()
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+
+    def wrap(self, site, func, message_type, latency=None):
+        """Returns func wrapped to be profiled as a frame of the given site
+
+        Args:
+            site: A str naming the hooked method, the first part of the frame name
+            func: The function to profile
+            message_type: A function returning the message type from the arguments of func
+            latency: A function returning the latency in seconds to record from the arguments of func, or None
+        """
+        names = {msg_type: f'{site} {name}' for msg_type, name in Message.TYPE_NAMES.items()}
+        frames_of = self._stack
+
+        def profiled(*args):
+            frames = frames_of.frames
+            if frames:
+                if frames[-1] is _SKIPPED:
+                    return func(*args)
+            else:
+                self._calls += 1
+                if self._calls % self._sample_every:
+                    frames.append(_SKIPPED)
+                    try:
+                        return func(*args)
+                    finally:
+                        frames.pop()
+            frame = [names[message_type(*args)], 0]
+            frames.append(frame)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args)
+            finally:
+                total = time.perf_counter_ns() - start
+                frames.pop()
+                if frames:
+                    frames[-1][1] += total
+                sample = ProfileSample((*(f[0] for f in frames), frame[0]), total, total - frame[1],
+                                       None if latency is None else latency(*args))
+                for sink in self._sinks:
+                    sink.record(sample)
+
+        return profiled
+
+
+class RingBufferSink:
+    """Keeps the most recent profile samples in memory
+
+    Attributes:
+        _samples: A collections.deque of the last capacity ProfileSamples
+    """
+
+    def __init__(self, capacity=10000):
+        self._samples = collections.deque(maxlen=capacity)
+
+    def record(self, sample):
+        self._samples.append(sample)
+
+    def samples(self):
+        """Returns a list of the kept samples, oldest first"""
+        return list(self._samples)
+
+    def summary(self):
+        """Returns a dict mapping each frame name to the count, total and self seconds, and mean latency of its samples
+
+        The mean latency is None for frames that record none.
+        """
+        totals = {}
+        for sample in list(self._samples):
+            entry = totals.setdefault(sample.stack[-1], [0, 0, 0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += sample.total_ns
+            entry[2] += sample.self_ns
+            if sample.latency is not None:
+                entry[3] += sample.latency
+                entry[4] += 1
+        return {name: {'count': count, 'total_seconds': total / 1e9, 'self_seconds': own / 1e9,
+                       'mean_latency': latency / latencies if latencies else None}
+                for name, (count, total, own, latency, latencies) in totals.items()}
+
+    def clear(self):
+        self._samples.clear()
+
+
+class CollapsedStackSink:
+    """Adds up the time spent in each stack of frames, in the collapsed format flame graph tools read
+
+    Each line of the output is a stack of frame names separated by semicolons and the microseconds spent in its last
+    frame, excluding the profiled calls it made, as read by flamegraph.pl, speedscope and inferno.
+
+    Attributes:
+        _self_ns: A dict mapping a tuple of frame names to the nanoseconds spent in its last frame
+    """
+
+    def __init__(self):
+        self._self_ns = {}
+        self._lock = threading.Lock()
+
+    def record(self, sample):
+        with self._lock:
+            self._self_ns[sample.stack] = self._self_ns.get(sample.stack, 0) + sample.self_ns
+
+    def lines(self):
+        """Returns the collapsed stack lines, heaviest first"""
+        stacks = sorted(list(self._self_ns.items()), key=lambda item: -item[1])
+        return [f"{';'.join(stack)} {own // 1000}" for stack, own in stacks]
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            f.writelines(line + '\n' for line in self.lines())
+
+    def clear(self):
+        with self._lock:
+            self._self_ns.clear()
@@ -0,0 +1,593 @@
+import argparse
+import heapq
+import itertools
+import math
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from benchmark import PROTOCOLS, run_scenario
+from membership import MemberView
+from message import Message
+from processor import Processor
+
+ROUND_PROTOCOLS = ('periodic-broadcast', 'attendance-list', 'neighborhood-surveillance')
+CROSS_CHECK_METRICS = ('convergence_time', 'detection_latency')
+# Re-formations that send no more message copies than this are played out one message at a time
+MAX_PLAYED_OUT_COPIES = 100000
+
+
+class RoundModel:
+    """A vectorized model of a whole group that advances one check-in period per step
+
+    Instead of one Processor object and one scheduled event per message, the group is held in NumPy arrays indexed by
+    processor id: clock offsets, crash times, the view as a bitmask row shared by every correct member, and each
+    processor's group. A step takes one check-in of every member at once, drawing all of its message delays in bulk,
+    and works out from them who misses whom, exactly as the protocols in processor.py would. Whenever a step detects a
+    crash, the re-formation that follows is resolved in the same step. A small one is played out one NEW_GROUP and
+    PRESENT copy at a time; in a large one the NEW_GROUP broadcasts race to cancel each other's detectors, the newest
+    group wins and the views agree once the last PRESENT of that group has arrived.
+
+    The model covers the periodic-broadcast, attendance-list and neighbor-surveillance protocols without join
+    coalescing. It relies on a re-formation being over before the next check-in, so the check-in period must be longer
+    than twice the broadcast delay and clock error, and under the attendance-list protocol longer than a token takes to
+    go through its segment. A large re-formation only counts each joiner's first PRESENT broadcast, so its message
+    count is lower than the object model's; played-out re-formations and the steady state are counted exactly.
+
+    Attributes:
+        _protocol: A int constant of the check-in protocol
+        _size: A int indicating the number of processors, with ids 1 to _size
+        _broadcast_delay: A float represents the upper bound time delay for broadcast
+        _datagram_delay: A float represents the upper bound time delay for direct message sending
+        _check_in_period: A float indicates the check in period of the processors
+        _max_clock_sync_error: A float indicating the maximum clock synchronization error
+        _attendance_tokens: A int indicating how many attendance lists circulate at once
+        _random: A numpy.random.Generator drawing the clock offsets and every message delay
+        _offsets: A float array with the clock error of each processor, index 0 is unused
+        _crash_at: A float array with the time each processor crashes at, infinity if it never does
+        _sorted_crash_at: _crash_at in ascending order, to count the correct processors at any time
+        _members: A bool array marking the members of the current group
+        _ring: An int array with the ids of the members in ascending order
+        _groups: A float array with the group V timestamp of each processor, 0 for none
+        _group: The V timestamp of the current group, 0 before the group is formed
+        _check_in: The V of the next check-in of the current group, None before the group is formed
+        _check_in_times: A float array with the time each member's timer for the next check-in fires at
+        _now: A float indicating the time up to which the group has been simulated
+        _pending_crashes: A dict mapping the id of each crashed member not excluded from the views yet to its crash time
+        _detection_latencies: A list of the times from a crash to the agreement on a view without the processor
+        _sent_counts: A dict with the number of message copies sent so far for each message type
+        _reformation_messages: A int counting the message copies of sent_counts that re-formations sent
+    """
+
+    def __init__(self, protocol, num_processors, broadcast_delay, datagram_delay, check_in_period,
+                 max_clock_sync_error, seed=None, attendance_tokens=1):
+        if numpy is None:
+            raise ImportError('the round model needs numpy')
+        if protocol not in (PROTOCOLS[name] for name in ROUND_PROTOCOLS):
+            raise ValueError(f'the round model does not cover protocol {protocol}')
+        if check_in_period <= 2 * (broadcast_delay + max_clock_sync_error):
+            raise ValueError('the check-in period must be longer than twice the broadcast delay and clock error')
+        longest_segment = math.ceil(num_processors / max(1, min(attendance_tokens, num_processors)))
+        if (protocol == Processor.ATTENDANCE_LIST_PROTOCOL and
+                longest_segment * datagram_delay + max_clock_sync_error >= check_in_period):
+            raise ValueError('the check-in period must be longer than an attendance list takes through its segment')
+        self._protocol = protocol
+        self._size = num_processors
+        self._broadcast_delay = broadcast_delay
+        self._datagram_delay = datagram_delay
+        self._check_in_period = check_in_period
+        self._max_clock_sync_error = max_clock_sync_error
+        self._attendance_tokens = attendance_tokens
+        self._random = numpy.random.default_rng(seed)
+        self._offsets = (self._random.random(num_processors + 1) - 0.5) * max_clock_sync_error
+        self._crash_at = numpy.full(num_processors + 1, numpy.inf)
+        self._crash_at[0] = -numpy.inf
+        self._sorted_crash_at = numpy.sort(self._crash_at)
+        self._members = numpy.zeros(num_processors + 1, dtype=bool)
+        self._ring = numpy.empty(0, dtype=numpy.int64)
+        self._groups = numpy.zeros(num_processors + 1)
+        self._group = 0
+        self._check_in = None
+        self._check_in_times = numpy.zeros(num_processors + 1)
+        self._now = 0.0
+        self._pending_crashes = {}
+        self._detection_latencies = []
+        self._sent_counts = {msg_type: 0 for msg_type in Message.TYPE_NAMES}
+        self._reformation_messages = 0
+
+    def form_group(self, at=0.0):
+        """Makes every correct processor call init_join at the given time
+
+        Returns:
+            The time the views agree at
+        """
+        ids = numpy.flatnonzero(self._crash_at > at)
+        return self._reform(ids, numpy.full(ids.size, float(at)), at + self._offsets[ids])
+
+    def crash(self, processor_ids, at):
+        """Crashes the given processors at the given time, which must not be before the last check-in that has run"""
+        if self._check_in is not None and self._ring.size and at < self.next_check_in_time() - self._check_in_period:
+            raise ValueError(f'cannot crash processors at {at}, the check-ins up to {self._now} have already run')
+        ids = numpy.asarray(processor_ids, dtype=numpy.int64)
+        self._crash_at[ids] = numpy.minimum(self._crash_at[ids], at)
+        self._sorted_crash_at = numpy.sort(self._crash_at)
+        for processor_id in ids[self._members[ids]].tolist():
+            self._pending_crashes.setdefault(processor_id, float(self._crash_at[processor_id]))
+
+    def step(self):
+        """Runs the next check-in of the group and the re-formation it leads to if it detects a crash
+
+        Returns:
+            The time the views agree at after a re-formation, None if the check-in detected nothing.
+        """
+        if self._check_in is None:
+            raise RuntimeError('the group must be formed before it can check in')
+        ring = self._ring
+        times = self._check_in_times[ring]
+        alive = self._crash_at[ring] > times
+        if self._protocol == Processor.PERIODIC_BROADCAST_PROTOCOL:
+            waits, missed = self._periodic_broadcast_round(ring, times, alive)
+        elif self._protocol == Processor.ATTENDANCE_LIST_PROTOCOL:
+            waits, missed = self._attendance_list_round(ring, times, alive)
+        else:
+            waits, missed = self._neighbor_surveillance_round(ring, times, alive)
+        check_times = times + waits
+        # Timers and clock readings are worked out as processor.py does, down to the rounding, as detectors only
+        # propose the very same V if their clocks read exactly the same
+        check_clocks = check_times + self._offsets[ring]
+        self._check_in_times[ring] = times + numpy.maximum(
+            self._check_in + self._check_in_period - (times + self._offsets[ring]), 0)
+        self._check_in += self._check_in_period
+        self._now = max(self._now, float(check_times.max()))
+        detecting = missed & (self._crash_at[ring] > check_times)
+        if not detecting.any():
+            return None
+        return self._reform(ring[detecting], check_times[detecting], check_clocks[detecting])
+
+    def run_until(self, until):
+        """Runs every check-in that starts no later than until
+
+        A check-in is run as a whole, so crashes that happen while it is under way must be added before it is run.
+        """
+        while self._check_in is not None and self._ring.size and self.next_check_in_time() <= until:
+            self.step()
+        self._now = max(self._now, until)
+
+    def next_check_in_time(self):
+        """Returns the time the earliest member starts the next check-in"""
+        return float(self._check_in_times[self._ring].min())
+
+    def _periodic_broadcast_round(self, ring, times, alive):
+        # Every member that is still up broadcasts; all copies arrive before the checks, which count the senders
+        self._sent_counts[Message.PRESENT] += int((self._correct_count(times[alive]) - 1).sum())
+        waits = numpy.full(ring.size, self._broadcast_delay + self._max_clock_sync_error)
+        missed = alive if not alive.all() else numpy.zeros(ring.size, dtype=bool)
+        return waits, missed
+
+    def _attendance_list_round(self, ring, times, alive):
+        size = ring.size
+        tokens = max(1, min(self._attendance_tokens, size))
+        positions = numpy.arange(size)
+        segments = ((positions + 1) * tokens - 1) // size
+        heads = segments * size // tokens
+        previous_heads = (segments - 1) % tokens * size // tokens
+        hops = numpy.where(positions == heads, numpy.where(segments > 0, heads, size) - previous_heads,
+                           positions - heads)
+
+        # Each position hands the token of its segment on to the next one, a head starts it at its check-in
+        delays = self._random.random(size) * self._datagram_delay
+        elapsed = numpy.concatenate(([0.0], numpy.cumsum(delays)))
+        send_times = times[heads] + elapsed[positions] - elapsed[heads]
+        failed = numpy.cumsum(self._crash_at[ring] <= send_times)
+        failed_before_head = numpy.where(heads > 0, failed[heads - 1], 0)
+        sent = failed == failed_before_head
+        successors = numpy.roll(ring, -1)
+        delivered = sent & (self._crash_at[successors] > send_times)
+        self._sent_counts[Message.ATTENDANCE_LIST] += int(delivered.sum())
+
+        return hops * self._datagram_delay + self._max_clock_sync_error, alive & ~numpy.roll(delivered, 1)
+
+    def _neighbor_surveillance_round(self, ring, times, alive):
+        successors = numpy.roll(ring, -1)
+        delivered = alive & (self._crash_at[successors] > times)
+        self._sent_counts[Message.NEIGHBORHOOD] += int(delivered.sum())
+        waits = numpy.full(ring.size, self._datagram_delay + self._max_clock_sync_error)
+        return waits, alive & ~numpy.roll(alive, 1)
+
+    def _reform(self, detectors, start_times, start_clocks):
+        """Resolves the re-formation started by the given detectors at the given times and clock readings
+
+        Each detector proposes the V its clock reading gives, so the detectors of one check-in can propose the very
+        same V. Detectors start in time order, and one whose check is overtaken by the NEW_GROUP message of an earlier
+        starter has had its timers cancelled and does not start. A re-formation of up to MAX_PLAYED_OUT_COPIES message
+        copies is played out message by message, larger ones are resolved in bulk.
+        """
+        order = numpy.argsort(start_times, kind='stable')
+        ids = detectors[order].tolist()
+        starts = start_times[order].tolist()
+        proposals = (start_clocks[order] + self._broadcast_delay + self._max_clock_sync_error).tolist()
+        if len(ids) * int(self._correct_count(starts[0])) ** 2 <= MAX_PLAYED_OUT_COPIES:
+            members, group, agreed_at, joined_at = self._play_out_reformation(ids, starts, proposals)
+        else:
+            members, group, agreed_at, joined_at = self._resolve_reformation(ids, starts, proposals)
+
+        self._members = members
+        self._ring = numpy.flatnonzero(members)
+        self._groups[:] = 0
+        self._groups[members] = group
+        self._group = group
+        self._check_in = group + self._check_in_period
+        # Each member sets its check-in timer when it last accepts a NEW_GROUP of the group, or starts it
+        joined_at = joined_at[members]
+        self._check_in_times[members] = joined_at + numpy.maximum(
+            self._check_in - (joined_at + self._offsets[members]), 0)
+        self._now = max(self._now, agreed_at)
+        for processor_id, crashed_at in list(self._pending_crashes.items()):
+            if not members[processor_id]:
+                del self._pending_crashes[processor_id]
+                self._detection_latencies.append(agreed_at - crashed_at)
+        return agreed_at
+
+    def _play_out_reformation(self, ids, starts, proposals):
+        """Handles every NEW_GROUP and PRESENT copy of a re-formation in time order as processor.py does
+
+        Each NEW_GROUP a processor accepts makes it broadcast its view again, and views of the same group merge, so
+        when several detectors propose the same V, as every detector of one periodic-broadcast check-in does, the
+        views agree well before any single starter's broadcast and PRESENT copies would make them.
+
+        Returns:
+            The members, as a bool array indexed by id, the group, the time the views agree at and a float array with
+            the time each processor last started or accepted a NEW_GROUP
+        """
+        crash_at = self._crash_at.tolist()
+        groups = self._groups.tolist()
+        views = [0] * (self._size + 1)
+        changed_at = [0.0] * (self._size + 1)
+        joined_at = [0.0] * (self._size + 1)
+        cancelled = [False] * (self._size + 1)
+        sequence = itertools.count()
+        # A None message type marks a detector's check, which proposes its group unless it has been cancelled
+        events = [(start, next(sequence), None, processor_id, processor_id, group, 0)
+                  for processor_id, start, group in zip(ids, starts, proposals)]
+        while events:
+            at, _, msg_type, receiver, sender, group, view = heapq.heappop(events)
+            if crash_at[receiver] <= at:
+                continue
+            bit = 1 << receiver
+            if msg_type is None:
+                if cancelled[receiver]:
+                    continue
+                groups[receiver], views[receiver], changed_at[receiver] = group, bit, at
+                joined_at[receiver] = at
+                self._broadcast_copies(events, sequence, receiver, at, Message.NEW_GROUP, group, 0)
+            elif msg_type == Message.NEW_GROUP:
+                if at + float(self._offsets[receiver]) > group or group < groups[receiver]:
+                    continue
+                cancelled[receiver] = True
+                joined_at[receiver] = at
+                view = (views[receiver] if group == groups[receiver] else bit) | 1 << sender
+                if view != views[receiver]:
+                    groups[receiver], views[receiver], changed_at[receiver] = group, view, at
+                self._broadcast_copies(events, sequence, receiver, at, Message.PRESENT, group, view)
+            elif group >= groups[receiver] and view != views[receiver]:
+                if group == groups[receiver]:
+                    view |= views[receiver]
+                view |= bit
+                if view != views[receiver] or group != groups[receiver]:
+                    groups[receiver], views[receiver], changed_at[receiver] = group, view, at
+
+        group = max(groups)
+        members = numpy.asarray(groups) == group
+        agreed_at = max(changed_at[processor_id] for processor_id in numpy.flatnonzero(members).tolist())
+        return members, group, agreed_at, numpy.asarray(joined_at)
+
+    def _broadcast_copies(self, events, sequence, sender, at, msg_type, group, view):
+        """Pushes a copy of the sender's broadcast to every other correct processor onto the events heap"""
+        copies = int(self._correct_count(at)) - 1
+        self._sent_counts[msg_type] += copies
+        self._reformation_messages += copies
+        arrivals = (at + self._random.random(self._size + 1) * self._broadcast_delay).tolist()
+        for receiver in numpy.flatnonzero(self._crash_at > at).tolist():
+            if receiver != sender:
+                heapq.heappush(events, (arrivals[receiver], next(sequence), msg_type, receiver, sender, group, view))
+
+    def _resolve_reformation(self, ids, starts, proposals):
+        """Resolves a re-formation with its message delays drawn in bulk
+
+        The starters of the newest V win, and a processor joins it on the first NEW_GROUP copy of that V. The views
+        agree once each joiner's PRESENT has reached the others. Members passed on in other processors' PRESENT
+        messages are left out, so the time is an upper bound, and only the joiners' first PRESENT is counted.
+
+        Returns:
+            The members, as a bool array indexed by id, the group, the time the views agree at and a float array with
+            the time each processor joined at
+        """
+        last_start = starts[-1]
+        cancelled_at = numpy.full(self._size + 1, numpy.inf)
+        winners, winner_group = [], None
+        for processor_id, start, group in zip(ids, starts, proposals):
+            if start >= cancelled_at[processor_id]:
+                continue
+            copies = int(self._correct_count(start)) - 1
+            self._sent_counts[Message.NEW_GROUP] += copies
+            self._reformation_messages += copies
+            new_group = None
+            if start < last_start:
+                new_group = self._new_group_arrivals(processor_id, start)
+                cancelled_at = numpy.minimum(cancelled_at, new_group)
+            if winner_group is None or group > winner_group:
+                winners, winner_group = [], group
+            if group == winner_group:
+                winners.append((processor_id, start, new_group))
+
+        # A processor joins the newest group on the first NEW_GROUP copy of it from any of its starters
+        winner = winners[0][0]
+        arrivals = None
+        for processor_id, start, new_group in winners:
+            if new_group is None:
+                new_group = self._new_group_arrivals(processor_id, start)
+            arrivals = new_group if arrivals is None else numpy.minimum(arrivals, new_group)
+        members = self._crash_at > arrivals
+        ring = numpy.flatnonzero(members)
+        joiners = ring[ring != winner]
+        copies = int((self._correct_count(arrivals[joiners]) - 1).sum())
+        self._sent_counts[Message.PRESENT] += copies
+        self._reformation_messages += copies
+        agreed_at = float(arrivals[ring].max())
+        if ring.size > 1:
+            # The last of each joiner's PRESENT copies to the other members, the maximum of ring.size - 1 delays
+            last_copies = self._broadcast_delay * self._random.random(joiners.size) ** (1 / (ring.size - 1))
+            agreed_at = max(agreed_at, float((arrivals[joiners] + last_copies).max()))
+        return members, winner_group, agreed_at, arrivals
+
+    def _new_group_arrivals(self, processor_id, start):
+        """Returns a float array with the time the NEW_GROUP broadcast started then reaches each processor"""
+        arrivals = start + self._random.random(self._size + 1) * self._broadcast_delay
+        arrivals[processor_id] = start
+        return arrivals
+
+    def _correct_count(self, times):
+        """Returns how many processors are correct at each of the given times"""
+        return self._size + 1 - numpy.searchsorted(self._sorted_crash_at, times, side='right')
+
+    @property
+    def now(self):
+        return self._now
+
+    @property
+    def group(self):
+        return self._group
+
+    @property
+    def view(self):
+        """Returns the view every correct member holds as a MemberView"""
+        bits = numpy.packbits(self._members & (self._crash_at > self._now), bitorder='little')
+        return MemberView.from_bits(int.from_bytes(bits.tobytes(), 'little'))
+
+    @property
+    def groups(self):
+        """Returns a float array with the group of each processor, indexed by id, 0 for none"""
+        return self._groups
+
+    @property
+    def agreed(self):
+        """Returns True if the view of the correct members is exactly the set of correct processors"""
+        correct = self._crash_at > self._now
+        return bool(numpy.array_equal(self._members & correct, correct))
+
+    @property
+    def detection_latencies(self):
+        return list(self._detection_latencies)
+
+    @property
+    def sent_counts(self):
+        """Returns a dict with the number of message copies sent so far for each message type"""
+        return dict(self._sent_counts)
+
+    @property
+    def reformation_messages(self):
+        return self._reformation_messages
+
+
+def attendance_tokens_needed(num_processors, datagram_delay, check_in_period, max_clock_sync_error):
+    """Returns the fewest attendance lists that each get through their segment within a check-in period
+
+    Returns:
+        A int, or None if not even a single hop fits in the period.
+    """
+    longest_segment = math.floor((check_in_period - max_clock_sync_error) / datagram_delay)
+    if longest_segment * datagram_delay + max_clock_sync_error >= check_in_period:
+        longest_segment -= 1
+    if longest_segment < 1:
+        return None
+    return math.ceil(num_processors / longest_segment)
+
+
+def _polled(at, start, poll_interval):
+    """Returns when polling every poll_interval seconds from start first sees what happened at the given time"""
+    return start + math.ceil((at - start) / poll_interval - 1e-9) * poll_interval
+
+
+def run_round_scenario(protocol, num_processors, broadcast_delay, datagram_delay, check_in_period, max_clock_sync_error,
+                       measured_periods=3, seed=0, attendance_tokens=1):
+    """Runs the benchmark scenario of benchmark.run_scenario on the round model and returns its results as a dict
+
+    Agreement is reported when a poll at the benchmark's poll interval would first see it, so the times compare
+    directly with the object model's.
+    """
+    cpu_start = time.process_time()
+    poll_interval = min(broadcast_delay, datagram_delay) / 4
+    timeout = 10 * check_in_period + num_processors * datagram_delay
+    model = RoundModel(PROTOCOLS[protocol], num_processors, broadcast_delay, datagram_delay, check_in_period,
+                       max_clock_sync_error, seed, attendance_tokens)
+    convergence_time = _polled(model.form_group(0.0), 0.0, poll_interval)
+
+    sent_before = sum(model.sent_counts.values()) - model.reformation_messages
+    crash_time = convergence_time + measured_periods * check_in_period
+    model.crash([num_processors // 2 + 1], crash_time)
+    model.run_until(crash_time)
+    # A crash detected by the check-in that starts the measurement window's last period is not part of its cost
+    check_in_messages = sum(model.sent_counts.values()) - model.reformation_messages
+    messages_per_period = (check_in_messages - sent_before) / measured_periods
+
+    detection_latency = None
+    while not model.detection_latencies and model.now - crash_time <= timeout:
+        model.step()
+    if model.detection_latencies:
+        detection_latency = _polled(crash_time + model.detection_latencies[0], crash_time, poll_interval) - crash_time
+    return {
+        'protocol': protocol,
+        'num_processors': num_processors,
+        'broadcast_delay': broadcast_delay,
+        'datagram_delay': datagram_delay,
+        'check_in_period': check_in_period,
+        'max_clock_sync_error': max_clock_sync_error,
+        'attendance_tokens': attendance_tokens,
+        'seed': seed,
+        'convergence_time': convergence_time,
+        'detection_latency': detection_latency,
+        'messages_per_period': messages_per_period,
+        'cpu_seconds': time.process_time() - cpu_start,
+    }
+
+
+def cross_check(protocols=ROUND_PROTOCOLS, sizes=(5, 10, 20), broadcast_delay=0.1, datagram_delay=0.01,
+                check_in_period=5, max_clock_sync_error=0.05, seeds=range(100), deviations=3):
+    """Compares the round model with the object model at small N
+
+    Both models run the benchmark scenario with every seed. A crash is noticed by the check-in right after it or by a
+    later one, so detection latency falls into modes a check-in period apart, and runs whose views never agree are a
+    mode of their own. For each protocol, size and metric in CROSS_CHECK_METRICS, the share of runs in every mode and
+    the mean of every mode must agree within the given number of standard errors of their difference, the means with
+    one poll interval to spare. A systematic offset of either metric, or a shift of runs from one mode to another, is
+    a mismatch however wide the modes are apart.
+
+    Returns:
+        A list of dicts with the protocol, size, metric, the mean of either model, how many runs of either model never
+        reached agreement, the largest difference in standard errors and whether the models agree.
+    """
+    poll_interval = min(broadcast_delay, datagram_delay) / 4
+    rows = []
+    for protocol in protocols:
+        for size in sizes:
+            runs = [(run_scenario(protocol, size, broadcast_delay, datagram_delay, check_in_period,
+                                  max_clock_sync_error, seed=seed),
+                     run_round_scenario(protocol, size, broadcast_delay, datagram_delay, check_in_period,
+                                        max_clock_sync_error, seed=seed)) for seed in seeds]
+            for metric in CROSS_CHECK_METRICS:
+                object_values = [run[0][metric] for run in runs]
+                round_values = [run[1][metric] for run in runs]
+                deviation = _largest_deviation(object_values, round_values, check_in_period, poll_interval)
+                rows.append({
+                    'protocol': protocol,
+                    'num_processors': size,
+                    'metric': metric,
+                    'object_model': _mean_and_error([v for v in object_values if v is not None])[0],
+                    'round_model': _mean_and_error([v for v in round_values if v is not None])[0],
+                    'object_never': object_values.count(None),
+                    'round_never': round_values.count(None),
+                    'deviation': deviation,
+                    'agrees': deviation <= deviations,
+                })
+    return rows
+
+
+def _largest_deviation(object_values, round_values, check_in_period, poll_interval):
+    """Returns the largest difference between the runs of the two models in standard errors of the difference
+
+    The values, None for a run that never agreed, are split into modes by the nearest whole number of check-in
+    periods. Both the share of runs in each mode and the mean of each mode are compared.
+    """
+    modes = {}
+    for model, values in enumerate((object_values, round_values)):
+        for value in values:
+            mode = None if value is None else round(value / check_in_period)
+            modes.setdefault(mode, ([], []))[model].append(value)
+    runs = (len(object_values), len(round_values))
+    largest = 0.0
+    for mode, (object_mode, round_mode) in modes.items():
+        pooled = (len(object_mode) + len(round_mode)) / sum(runs)
+        error = math.sqrt(pooled * (1 - pooled) * (1 / runs[0] + 1 / runs[1]))
+        difference = abs(len(object_mode) / runs[0] - len(round_mode) / runs[1])
+        largest = max(largest, _in_errors(difference, error))
+        if mode is not None and len(object_mode) > 1 and len(round_mode) > 1:
+            # Both models poll for agreement, so the means of a mode are only known to within one poll interval
+            (object_mean, object_error), (round_mean, round_error) = map(_mean_and_error, (object_mode, round_mode))
+            difference = max(abs(object_mean - round_mean) - poll_interval, 0.0)
+            largest = max(largest, _in_errors(difference, math.hypot(object_error, round_error)))
+    return largest
+
+
+def _in_errors(difference, error):
+    if not difference:
+        return 0.0
+    return difference / error if error else math.inf
+
+
+def _mean_and_error(values):
+    """Returns the mean of the values and its standard error, the mean is None without any values"""
+    if not values:
+        return None, 0.0
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, 0.0
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return mean, math.sqrt(variance / len(values))
+
+
+def _format_mean(mean):
+    return 'none' if mean is None else f'{mean:.4f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the benchmark scenario on the vectorized round model.')
+    parser.add_argument('--protocols', nargs='+', choices=ROUND_PROTOCOLS, default=list(ROUND_PROTOCOLS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--broadcast-delay', type=float, default=0.1)
+    parser.add_argument('--datagram-delay', type=float, default=0.01)
+    parser.add_argument('--check-in-period', type=float, default=5)
+    parser.add_argument('--max-clock-sync-error', type=float, default=0.05)
+    parser.add_argument('--attendance-tokens', type=int, default=1,
+                        help='attendance lists circulating at once under the attendance-list protocol')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cross-check', action='store_true',
+                        help='compare the round model with the object model at small N instead')
+    args = parser.parse_args()
+
+    if args.cross_check:
+        rows = cross_check(args.protocols, broadcast_delay=args.broadcast_delay, datagram_delay=args.datagram_delay,
+                           check_in_period=args.check_in_period, max_clock_sync_error=args.max_clock_sync_error)
+        for row in rows:
+            print(f"{row['protocol']:26} N={row['num_processors']:<4} {row['metric']:20} "
+                  f"object={_format_mean(row['object_model'])} round={_format_mean(row['round_model'])} "
+                  f"never={row['object_never']}/{row['round_never']} deviation={row['deviation']:.1f} "
+                  f"{'ok' if row['agrees'] else 'MISMATCH'}")
+        raise SystemExit(0 if all(row['agrees'] for row in rows) else 1)
+
+    for protocol in args.protocols:
+        for size in args.sizes:
+            tokens = args.attendance_tokens
+            if protocol == 'attendance-list':
+                # A single list cannot go round a large ring within a period, so it is split into enough segments
+                needed = attendance_tokens_needed(size, args.datagram_delay, args.check_in_period,
+                                                  args.max_clock_sync_error)
+                tokens = max(tokens, needed or tokens)
+            try:
+                result = run_round_scenario(protocol, size, args.broadcast_delay, args.datagram_delay,
+                                            args.check_in_period, args.max_clock_sync_error, seed=args.seed,
+                                            attendance_tokens=tokens)
+            except ValueError as e:
+                print(f"{protocol:26} N={size:<7} unsupported: {e}")
+                continue
+            detection = result['detection_latency']
+            print(f"{protocol:26} N={size:<7} converge={result['convergence_time']:.3f}s "
+                  f"detect={'never' if detection is None else f'{detection:.3f}s'} "
+                  f"msgs/period={result['messages_per_period']:.0f} cpu={result['cpu_seconds']:.2f}s"
+                  f"{f' tokens={tokens}' if tokens != args.attendance_tokens else ''}")
+
+
+if __name__ == '__main__':
+    main()
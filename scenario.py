@@ -0,0 +1,240 @@
+import argparse
+import collections
+import json
+import logging
+import time
+
+from benchmark import PROTOCOLS, build_group, wait_for_agreement
+from events import log_event, logger
+from membership import MemberView
+from processor import Processor
+
+CRASH = 'crash'
+RECOVER = 'recover'
+ADD = 'add'
+DELAYS = 'delays'
+JOIN = 'join'
+ACTIONS = (CRASH, RECOVER, ADD, DELAYS, JOIN)
+
+ScenarioEvent = collections.namedtuple('ScenarioEvent', ('at', 'action', 'value'))
+ScenarioEvent.__doc__ = """One action of a scenario, taken at seconds after the scenario starts"""
+
+
+class Scenario:
+    """A timed script of bulk changes applied to a running group without rebuilding it
+
+    In JSON a scenario is a list of events, each an object with the time 'at' in seconds after the scenario starts
+    and one action:
+        {"at": 2, "crash": [3, 4, 5]}      crashes the given processors
+        {"at": 6, "recover": [3, 4]}       restarts the given crashed processors, each re-forms the group
+        {"at": 8, "add": 10}               adds that many processors like the existing ones, each re-forms the group
+        {"at": 9, "delays": {"broadcast_delay": 0.2, "datagram_delay": 0.02}}   changes the delay bounds
+        {"at": 12, "join": [1]}            makes the given processors re-form the group, "all" for every correct one
+
+    The events due at the same time form one batch, applied by a single scheduler callback, so a crash of a thousand
+    processors costs one timer and is seen by the protocol as simultaneous.
+
+    Attributes:
+        _events: A tuple of ScenarioEvent in time order, events due at the same time in script order
+    """
+
+    def __init__(self, events):
+        self._events = tuple(sorted(events, key=lambda event: event.at))
+
+    @classmethod
+    def from_json(cls, data):
+        """Returns the Scenario of the JSON form described in the class docstring
+
+        Raises:
+            ValueError: If an event has no valid time or not exactly one valid action.
+        """
+        if not isinstance(data, list):
+            raise ValueError('a scenario is a list of events')
+        events = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                raise ValueError(f'event {index} is not an object')
+            at = item.get('at')
+            if not isinstance(at, (int, float)) or isinstance(at, bool) or at < 0:
+                raise ValueError(f'event {index} needs a time "at" of zero or more seconds')
+            actions = [key for key in item if key != 'at']
+            if len(actions) != 1 or actions[0] not in ACTIONS:
+                raise ValueError(f'event {index} needs exactly one action out of {", ".join(ACTIONS)}')
+            action = actions[0]
+            events.append(ScenarioEvent(float(at), action, _parse_value(index, action, item[action])))
+        return cls(events)
+
+    def to_json(self):
+        """Returns the JSON form of the scenario, from_json turns it back into an equal scenario"""
+        return [{'at': event.at, event.action: event.value} for event in self._events]
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_json(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def batches(self):
+        """Returns a list of (time, events) pairs, one for each time at which events are due"""
+        batches = []
+        for event in self._events:
+            if batches and batches[-1][0] == event.at:
+                batches[-1][1].append(event)
+            else:
+                batches.append((event.at, [event]))
+        return batches
+
+    def start(self, channel, settings=None):
+        """Schedules every batch on the channel's scheduler, relative to now
+
+        Args:
+            settings: The (max clock sync error, check-in period, protocol, join coalescing, attendance tokens) of
+                      added processors, by default those of the channel's first processor
+
+        Returns:
+            A list of the timer handles of the batches, cancelling them stops the rest of the scenario
+        """
+        return [channel.scheduler.call_later(at, apply_events, channel, events, settings)
+                for at, events in self.batches()]
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self._events == other._events
+
+
+def _parse_value(index, action, value):
+    if action == ADD:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(f'event {index} must add a positive number of processors')
+        return value
+    if action == DELAYS:
+        if not isinstance(value, dict) or not value or set(value) - {'broadcast_delay', 'datagram_delay'}:
+            raise ValueError(f'event {index} must set broadcast_delay and/or datagram_delay')
+        if any(not isinstance(delay, (int, float)) or delay <= 0 for delay in value.values()):
+            raise ValueError(f'event {index} must set positive delays')
+        return dict(value)
+    if action == JOIN and value == 'all':
+        return value
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise ValueError(f'event {index} must list processor ids')
+    return list(value)
+
+
+def apply_events(channel, events, settings=None):
+    """Applies the given scenario events to the running channel one after the other"""
+    for event in events:
+        if event.action == DELAYS:
+            channel.set_delays(**event.value)
+        elif event.action == ADD:
+            add_processors(channel, event.value, settings)
+        elif event.action == JOIN and event.value == 'all':
+            for processor in channel.processors:
+                if processor.status == Processor.NORMAL:
+                    channel.dispatch(processor, processor.init_join)
+        else:
+            for processor in _find_processors(channel, event.value):
+                if event.action == CRASH:
+                    channel.dispatch(processor, processor.crash)
+                elif event.action == RECOVER:
+                    channel.dispatch(processor, processor.recover)
+                elif processor.status == Processor.NORMAL:
+                    channel.dispatch(processor, processor.init_join)
+
+
+def add_processors(channel, count, settings=None):
+    """Registers count new processors to the running channel, each re-forms the group to join it
+
+    Returns:
+        A list of the new processors
+    """
+    if settings is None:
+        settings = channel.processors[0].settings
+    processors = []
+    for _ in range(count):
+        processor = Processor(channel, *settings)
+        channel.register_processor(processor)
+        processors.append(processor)
+    for processor in processors:
+        channel.dispatch(processor, processor.init_join)
+    return processors
+
+
+def _find_processors(channel, processor_ids):
+    for processor_id in processor_ids:
+        processor = channel.find_processor(processor_id)
+        if isinstance(processor, Processor):
+            yield processor
+        elif logger.isEnabledFor(logging.WARNING):
+            log_event(logging.WARNING, 'scenario_unknown_processor', processor=processor_id)
+
+
+def run_scenario_script(scenario, protocol, num_processors, broadcast_delay, datagram_delay, check_in_period,
+                        max_clock_sync_error, duration, seed=0, join_coalescing=False, attendance_tokens=1):
+    """Runs a scenario against a group on a virtual clock and returns the results as a dict
+
+    The group is formed first; the scenario starts once the views agree and runs for duration seconds, so the same
+    script gives the same results with the same seed.
+    """
+    cpu_start = time.process_time()
+    scheduler, channel = build_group(protocol, num_processors, broadcast_delay, datagram_delay, check_in_period,
+                                     max_clock_sync_error, seed=seed, join_coalescing=join_coalescing,
+                                     attendance_tokens=attendance_tokens)
+    for processor in channel.processors:
+        processor.init_join()
+    convergence_time = wait_for_agreement(scheduler, channel, min(broadcast_delay, datagram_delay) / 4,
+                                          10 * check_in_period + num_processors * datagram_delay)
+
+    sent_before = sum(channel.sent_counts.values())
+    scenario.start(channel)
+    scheduler.run_for(duration)
+    correct = [p for p in channel.processors if p.status == Processor.NORMAL]
+    expected = MemberView(p.id for p in correct)
+    mean_detection, detected = channel.detection_latency()
+    return {
+        'protocol': protocol,
+        'num_processors': len(channel.processors),
+        'correct_processors': len(correct),
+        'convergence_time': convergence_time,
+        'agreed': all(p.view == expected for p in correct),
+        'messages': sum(channel.sent_counts.values()) - sent_before,
+        'mean_detection_latency': mean_detection,
+        'detected_crashes': detected,
+        'cpu_seconds': time.process_time() - cpu_start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a scenario script against a group on a virtual clock.')
+    parser.add_argument('script', help='JSON file with the scenario events')
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='periodic-broadcast')
+    parser.add_argument('--processors', type=int, default=20)
+    parser.add_argument('--broadcast-delay', type=float, default=0.1)
+    parser.add_argument('--datagram-delay', type=float, default=0.01)
+    parser.add_argument('--check-in-period', type=float, default=5)
+    parser.add_argument('--max-clock-sync-error', type=float, default=0.05)
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run after the scenario starts')
+    parser.add_argument('--join-coalescing', action='store_true', help='let one detector re-form the group per failure')
+    parser.add_argument('--attendance-tokens', type=int, default=1,
+                        help='attendance lists circulating at once under the attendance-list protocol')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    result = run_scenario_script(Scenario.load(args.script), args.protocol, args.processors, args.broadcast_delay,
+                                 args.datagram_delay, args.check_in_period, args.max_clock_sync_error, args.duration,
+                                 args.seed, args.join_coalescing, args.attendance_tokens)
+    detection = result['mean_detection_latency']
+    print(f"{args.protocol} N={result['num_processors']} correct={result['correct_processors']} "
+          f"agreed={result['agreed']} messages={result['messages']} detected={result['detected_crashes']} "
+          f"mean_detection={'none' if detection is None else f'{detection:.3f}s'} cpu={result['cpu_seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import datetime
+import heapq
+import itertools
+import time
+
+import threading
+
+from threading import Timer
+
+# Looked up once, reading the local timezone is far more expensive than reading the clock
+LOCAL_TIMEZONE = datetime.datetime.now(datetime.timezone.utc).astimezone().tzinfo
+MONOTONIC_EPOCH = time.time() - time.monotonic()
+
+
+def monotonic_to_datetime(seconds):
+    """Returns the local datetime of a time.monotonic() reading, for display only"""
+    return datetime.datetime.fromtimestamp(seconds + MONOTONIC_EPOCH, tz=LOCAL_TIMEZONE)
+
+
+class ThreadScheduler:
+    """The default scheduler that runs every event on its own thread
+
+    Each call to call_later starts a threading.Timer, so events fire in real time. This is the behaviour the
+    Channel and Processor classes have always had, and it stays the default.
+    """
+
+    @staticmethod
+    def now():
+        """Returns the current monotonic time in seconds"""
+        return time.monotonic()
+
+    @staticmethod
+    def to_datetime(seconds):
+        """Returns the local datetime of a reading of now(), for display only"""
+        return monotonic_to_datetime(seconds)
+
+    @staticmethod
+    def call_later(delay, callback, *args):
+        """Runs callback(*args) after delay seconds
+
+        Returns:
+            A handle with a cancel() method
+        """
+        t = Timer(delay, callback, args=args)
+        t.start()
+        return t
+
+    def stop(self):
+        """Does nothing, timers that are already started still fire on their own threads"""
+
+    @staticmethod
+    def stats():
+        """Returns a dict with the backlog of timer threads that have not fired yet"""
+        return {'backlog': sum(1 for t in threading.enumerate() if isinstance(t, Timer))}
+
+
+class SimulationEvent:
+    """A pending event in a SimulationScheduler
+
+    Attributes:
+        time: A float indicating the virtual time the event fires at
+        callback: The function to call when the event fires
+        args: A tuple of arguments passed to the callback
+        cancelled: A bool indicating whether the event has been cancelled
+    """
+
+    __slots__ = ('time', 'callback', 'args', 'cancelled')
+
+    def __init__(self, fire_time, callback, args):
+        self.time = fire_time
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancels the event, it will be skipped when its time comes"""
+        self.cancelled = True
+
+
+class SimulationScheduler:
+    """A discrete-event scheduler driven by a virtual clock
+
+    Events are kept in a priority queue ordered by their firing time. Nothing runs until run() or step() is called;
+    the virtual clock then jumps straight from one event to the next, so hours of protocol time can be simulated in
+    seconds on a single thread. Events with the same firing time run in the order they were scheduled.
+
+    Attributes:
+        _now: A float indicating the current virtual time in seconds
+        _epoch: A float indicating the wall-clock time in seconds that virtual time 0 is displayed as
+        _queue: A heap of (time, sequence, SimulationEvent) tuples
+        _sequence: An iterator giving each event a tie-breaking sequence number
+    """
+
+    def __init__(self, start=0.0):
+        """Inits the scheduler with its virtual clock set to start, which is displayed as the current wall time"""
+        self._now = start
+        self._epoch = time.time() - start
+        self._queue = []
+        self._sequence = itertools.count()
+
+    def now(self):
+        """Returns the current virtual time in seconds"""
+        return self._now
+
+    def to_datetime(self, seconds):
+        """Returns the local datetime of a virtual time, for display only"""
+        return datetime.datetime.fromtimestamp(self._epoch + seconds, tz=LOCAL_TIMEZONE)
+
+    def call_later(self, delay, callback, *args):
+        """Schedules callback(*args) to run delay virtual seconds from now
+
+        Returns:
+            A SimulationEvent that can be cancelled
+        """
+        event = SimulationEvent(self._now + max(delay, 0), callback, args)
+        heapq.heappush(self._queue, (event.time, next(self._sequence), event))
+        return event
+
+    def call_at(self, fire_time, callback, *args):
+        """Schedules callback(*args) to run at the given virtual time, or right away if it has already passed
+
+        Returns:
+            A SimulationEvent that can be cancelled
+        """
+        event = SimulationEvent(max(fire_time, self._now), callback, args)
+        heapq.heappush(self._queue, (event.time, next(self._sequence), event))
+        return event
+
+    def next_time(self):
+        """Returns the virtual time of the next pending event, None if there is none"""
+        queue = self._queue
+        while queue and queue[0][2].cancelled:
+            heapq.heappop(queue)
+        return queue[0][0] if queue else None
+
+    def step(self):
+        """Runs the next pending event
+
+        Returns:
+            True if an event was run, False if the queue is empty.
+        """
+        while self._queue:
+            fire_time, _, event = heapq.heappop(self._queue)
+            if event.cancelled:
+                continue
+            self._now = fire_time
+            event.callback(*event.args)
+            return True
+        return False
+
+    def run(self, until=None):
+        """Runs events in time order until the queue is empty or the next event is later than until
+
+        The virtual clock is left at until when it is given, so consecutive calls cover contiguous time spans.
+        """
+        queue = self._queue
+        while queue:
+            fire_time, _, event = queue[0]
+            if until is not None and fire_time > until:
+                break
+            heapq.heappop(queue)
+            if event.cancelled:
+                continue
+            self._now = fire_time
+            event.callback(*event.args)
+        if until is not None and until > self._now:
+            self._now = until
+
+    def run_for(self, duration):
+        """Runs events for the next duration virtual seconds"""
+        self.run(self._now + duration)
+
+    def stats(self):
+        """Returns a dict with the backlog of pending events, virtual events are never late"""
+        return {'backlog': self.pending, 'mean_lateness': 0.0, 'max_lateness': 0.0}
+
+    @property
+    def pending(self):
+        """Returns the number of events that are still waiting to fire"""
+        return sum(1 for _, _, event in self._queue if not event.cancelled)
@@ -0,0 +1,395 @@
+import argparse
+import math
+import multiprocessing
+import time
+
+from benchmark import PROTOCOLS
+from channel import Channel
+from message import Message
+from processor import Processor
+from scheduler import SimulationScheduler
+from transport import RemoteProcessor
+
+_MASK = (1 << 64) - 1
+
+
+class ShardChannel(Channel):
+    """A Channel that hosts one shard of a group whose processors are spread over several processes
+
+    Messages to processors of other shards are collected as records and handed to the coordinator at the end of each
+    window. Every delay is at least lookahead, so a message sent inside a window can never be due inside the same
+    window, and each shard can run a window without hearing from the others.
+
+    Nothing depends on how the group is partitioned: a processor's clock error comes from a random stream seeded with
+    its id, messages are numbered per sender, and each copy's delay is a hash of the seed, the message id and the
+    receiver id. A run gives the same result with any number of shards, one included.
+
+    Attributes:
+        _shard: A int indicating the index of this shard
+        _shard_count: A int indicating how many shards the group is spread over
+        _num_processors: A int indicating the size of the whole group
+        _lookahead: A float indicating the shortest delay of any message in seconds
+        _seed: A int the delays and clock errors are derived from
+        _crash_times: A dict mapping the id of each crashed local processor to the virtual time it crashed
+        _message_sequences: A dict mapping each local processor id to the number of messages it has created
+        _remote: A dict caching the RemoteProcessor of each remote id seen so far
+        _outbound: A list with, for each shard, the records of the messages sent to it in the current window
+    """
+
+    def __init__(self, broadcast_delay, datagram_delay, scheduler, shard, shard_count, num_processors, lookahead,
+                 seed=0):
+        super().__init__(broadcast_delay, datagram_delay, scheduler, seed=seed)
+        self._shard = shard
+        self._shard_count = shard_count
+        self._num_processors = num_processors
+        self._lookahead = lookahead
+        self._seed = seed or 0
+        self._crash_times = {}
+        self._message_sequences = {}
+        self._remote = {}
+        self._outbound = [[] for _ in range(shard_count)]
+        self._processor_ids = iter(shard_processor_ids(shard, shard_count, num_processors))
+
+    def next_processor_id(self):
+        """Returns the next id of this shard and reseeds the random stream the processor draws its clock error from"""
+        processor_id = next(self._processor_ids)
+        self._random.seed(f'{self._seed}:{processor_id}')
+        return processor_id
+
+    def shard_of(self, processor_id):
+        return shard_of(processor_id, self._shard_count, self._num_processors)
+
+    def update_status(self, processor):
+        if processor.status == Processor.CRASHED and processor.id in self._all_processors:
+            self._crash_times.setdefault(processor.id, self._scheduler.now())
+        super().update_status(processor)
+
+    def find_processor(self, processor_id):
+        processor = self._all_processors.get(processor_id)
+        if processor is not None:
+            return processor
+        remote = self._remote.get(processor_id)
+        if remote is None:
+            remote = self._remote[processor_id] = RemoteProcessor(processor_id)
+        return remote
+
+    def create_message(self, processor, msg_type):
+        sequence = self._message_sequences.get(processor.id, 0)
+        self._message_sequences[processor.id] = sequence + 1
+        return Message(processor, self, msg_type, message_id=processor.id << 32 | sequence)
+
+    def send_message(self, message):
+        receiver_id = message.receiver.id
+        sent_at = self._scheduler.now()
+        shard = self.shard_of(receiver_id)
+        if shard != self._shard:
+            self._outbound[shard].append((message.id, message.type, message.sender.id, receiver_id, message.content,
+                                          sent_at))
+            return
+        self._send_datagram(message, self._all_processors[receiver_id], sent_at)
+
+    def broadcast(self, message):
+        sender = message.sender
+        if sender.status == Processor.CRASHED:
+            return
+        message.freeze()
+        sent_at = self._scheduler.now()
+        self._send_broadcast_copies(message, sent_at)
+        record = (message.id, message.type, sender.id, None, message.content, sent_at)
+        for shard, outbound in enumerate(self._outbound):
+            if shard != self._shard:
+                outbound.append(record)
+
+    def deliver_record(self, record):
+        """Delivers a message record sent by another shard to the local processors it is addressed to"""
+        message_id, msg_type, sender_id, receiver_id, content, sent_at = record
+        message = Message(self.find_processor(sender_id), self, msg_type, message_id=message_id)
+        message.content = content
+        if receiver_id is None:
+            message.freeze()
+            self._send_broadcast_copies(message, sent_at)
+        else:
+            self._send_datagram(message, self._all_processors[receiver_id], sent_at)
+
+    def take_outbound(self):
+        """Returns the records sent to each shard since the last call and starts collecting new ones"""
+        outbound = self._outbound
+        self._outbound = [[] for _ in range(self._shard_count)]
+        return outbound
+
+    def _send_datagram(self, message, receiver, sent_at):
+        if self._crashed_by(receiver.id, sent_at):
+            return
+        self._sent_total.inc(Message.TYPE_NAMES[message.type])
+        self._processor_sent_total.inc(message.sender.id)
+        delay = self._delay(message.id, receiver.id, self._datagram_delay)
+        self._scheduler.call_at(sent_at + delay, self._send_message_to, message, receiver, sent_at, 'datagram',
+                                self._datagram_delay)
+
+    def _send_broadcast_copies(self, message, sent_at):
+        sender_id = message.sender.id
+        copies = 0
+        for processor in self._all_processors.values():
+            if processor.id == sender_id or self._crashed_by(processor.id, sent_at):
+                continue
+            copies += 1
+            delay = self._delay(message.id, processor.id, self._broadcast_delay)
+            self._scheduler.call_at(sent_at + delay, self._send_message_to, message, processor, sent_at, 'broadcast',
+                                    self._broadcast_delay)
+        if copies:
+            self._sent_total.inc(Message.TYPE_NAMES[message.type], amount=copies)
+            self._processor_sent_total.inc(sender_id, amount=copies)
+
+    def _crashed_by(self, processor_id, moment):
+        crash_time = self._crash_times.get(processor_id)
+        return crash_time is not None and crash_time <= moment
+
+    def _delay(self, message_id, receiver_id, bound):
+        unit = _mix(_mix(self._seed ^ message_id) ^ receiver_id) / 2 ** 64
+        return self._lookahead + unit * (bound - self._lookahead)
+
+
+class Shard:
+    """One partition of a sharded simulation: a ShardChannel, its processors and their virtual clock"""
+
+    def __init__(self, shard, shard_count, config):
+        self._scheduler = SimulationScheduler()
+        self._channel = ShardChannel(config['broadcast_delay'], config['datagram_delay'], self._scheduler, shard,
+                                     shard_count, config['num_processors'], config['lookahead'], config['seed'])
+        for _ in shard_processor_ids(shard, shard_count, config['num_processors']):
+            self._channel.register_processor(Processor(
+                self._channel, config['max_clock_sync_error'], config['check_in_period'],
+                PROTOCOLS[config['protocol']], config['join_coalescing'], config['attendance_tokens']))
+        for processor in self._channel.processors:
+            self._scheduler.call_at(config['join_at'], processor.init_join)
+        for crash_time, processor_id in config['crashes']:
+            processor = self._channel.find_processor(processor_id)
+            if isinstance(processor, Processor):
+                self._scheduler.call_at(crash_time, processor.crash)
+
+    def advance(self, until, inbound):
+        """Delivers the records sent to this shard, runs the shard until the given virtual time and returns the
+        records it sent to each shard and the time of its next pending event"""
+        for record in inbound:
+            self._channel.deliver_record(record)
+        self._scheduler.run(until)
+        return self._channel.take_outbound(), self._scheduler.next_time()
+
+    def report(self):
+        """Returns the final state of the shard's processors and the messages they sent"""
+        processors = {p.id: (p.status, p.view.bits, p.group) for p in self._channel.processors}
+        return {'processors': processors, 'sent_counts': self._channel.sent_counts}
+
+
+class ShardedSimulation:
+    """Runs one group on a virtual clock split over several worker processes
+
+    Processor ids are split into contiguous ranges, one per shard. The coordinator advances all shards window by
+    window: each window starts at the earliest pending event or message of any shard and is shorter than the
+    lookahead, the shortest possible message delay, so the shards run it in parallel without missing anything from
+    each other. The messages a shard sends to others are passed on at the end of the window. Windows with nothing to
+    do are skipped.
+
+    Attributes:
+        _config: A dict with the group configuration every shard is built from
+        _shards: A int indicating the number of shards
+    """
+
+    def __init__(self, protocol, num_processors, broadcast_delay, datagram_delay, check_in_period,
+                 max_clock_sync_error, shards=None, seed=0, lookahead=None, join_coalescing=False,
+                 attendance_tokens=1):
+        """Inits the simulation, the lookahead defaults to a tenth of the smaller delay bound
+
+        In a sharded run each delay is drawn between the lookahead and its bound rather than between 0 and the bound.
+        """
+        if lookahead is None:
+            lookahead = min(broadcast_delay, datagram_delay) / 10
+        if not 0 < lookahead < min(broadcast_delay, datagram_delay):
+            raise ValueError('lookahead must be positive and smaller than both delay bounds')
+        self._shards = min(shards or multiprocessing.cpu_count(), num_processors)
+        self._config = {
+            'protocol': protocol,
+            'num_processors': num_processors,
+            'broadcast_delay': broadcast_delay,
+            'datagram_delay': datagram_delay,
+            'check_in_period': check_in_period,
+            'max_clock_sync_error': max_clock_sync_error,
+            'seed': seed,
+            'lookahead': lookahead,
+            'join_coalescing': join_coalescing,
+            'attendance_tokens': attendance_tokens,
+        }
+
+    @property
+    def shards(self):
+        return self._shards
+
+    def run(self, until, crashes=(), join_at=0.0):
+        """Forms the group at join_at, crashes the given processors and runs until the given virtual time
+
+        Args:
+            until: A float indicating the virtual time to stop at
+            crashes: An iterable of (virtual time, processor id) pairs
+            join_at: A float indicating the virtual time every processor calls init_join at
+
+        Returns:
+            A dict with each processor's final (status, view bits, group), the message counts by type, whether the
+            correct processors agree on the view, the number of windows run and the wall-clock seconds it took.
+        """
+        config = dict(self._config, crashes=list(crashes), join_at=join_at)
+        started = time.perf_counter()
+        if self._shards == 1:
+            shards = [_LocalShard(Shard(0, 1, config))]
+        else:
+            shards = [_ProcessShard(index, self._shards, config) for index in range(self._shards)]
+        try:
+            windows = self._run_windows(shards, until)
+            reports = [shard.report() for shard in shards]
+        finally:
+            for shard in shards:
+                shard.close()
+
+        processors = {}
+        sent_counts = {}
+        for report in reports:
+            processors.update(report['processors'])
+            for msg_type, count in report['sent_counts'].items():
+                sent_counts[msg_type] = sent_counts.get(msg_type, 0) + count
+        correct = [pid for pid, (status, _, _) in processors.items() if status == Processor.NORMAL]
+        expected = sum(1 << pid for pid in correct)
+        return {
+            'processors': dict(sorted(processors.items())),
+            'sent_counts': sent_counts,
+            'agreed': all(processors[pid][1] == expected for pid in correct),
+            'windows': windows,
+            'wall_seconds': time.perf_counter() - started,
+        }
+
+    def _run_windows(self, shards, until):
+        lookahead = self._config['lookahead']
+        next_times = [0.0] * len(shards)
+        inboxes = [[] for _ in shards]
+        windows = 0
+        while True:
+            pending = [t for t in next_times if t is not None]
+            pending.extend(record[-1] + lookahead for inbox in inboxes for record in inbox)
+            if not pending or min(pending) > until:
+                return windows
+            # A message sent at or after the window start is due at least lookahead later, after the window ends
+            window_end = min(math.nextafter(min(pending) + lookahead, -math.inf), until)
+            for shard, inbox in zip(shards, inboxes):
+                shard.send_advance(window_end, inbox)
+            inboxes = [[] for _ in shards]
+            for index, shard in enumerate(shards):
+                outbound, next_times[index] = shard.receive_advance()
+                for destination, records in enumerate(outbound):
+                    inboxes[destination].extend(records)
+            windows += 1
+
+
+class _LocalShard:
+    """Runs a Shard in the coordinator's own process"""
+
+    def __init__(self, shard):
+        self._shard = shard
+        self._result = None
+
+    def send_advance(self, until, inbound):
+        self._result = self._shard.advance(until, inbound)
+
+    def receive_advance(self):
+        return self._result
+
+    def report(self):
+        return self._shard.report()
+
+    def close(self):
+        pass
+
+
+class _ProcessShard:
+    """Runs a Shard in a worker process and talks to it over a pipe"""
+
+    def __init__(self, index, shard_count, config):
+        self._connection, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve_shard, args=(child, index, shard_count, config),
+                                                daemon=True)
+        self._process.start()
+        child.close()
+
+    def send_advance(self, until, inbound):
+        self._connection.send(('advance', until, inbound))
+
+    def receive_advance(self):
+        return self._connection.recv()
+
+    def report(self):
+        self._connection.send(('report',))
+        return self._connection.recv()
+
+    def close(self):
+        if self._process.is_alive():
+            self._connection.send(('stop',))
+            self._process.join()
+        self._connection.close()
+
+
+def _serve_shard(connection, index, shard_count, config):
+    shard = Shard(index, shard_count, config)
+    while True:
+        command, *args = connection.recv()
+        if command == 'advance':
+            connection.send(shard.advance(*args))
+        elif command == 'report':
+            connection.send(shard.report())
+        else:
+            return
+
+
+def shard_of(processor_id, shard_count, num_processors):
+    """Returns the index of the shard hosting the given processor, ids 1 to num_processors are split in ranges"""
+    return (processor_id - 1) * shard_count // num_processors
+
+
+def shard_processor_ids(shard, shard_count, num_processors):
+    """Returns the range of processor ids hosted by the given shard"""
+    return range(-(-shard * num_processors // shard_count) + 1, -(-(shard + 1) * num_processors // shard_count) + 1)
+
+
+def _mix(value):
+    """The splitmix64 finalizer, turns a int into 64 well-mixed bits"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs one large group on a virtual clock across worker processes.')
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='hierarchical')
+    parser.add_argument('--processors', type=int, default=10000)
+    parser.add_argument('--shards', type=int, default=None, help='number of worker processes, all cores by default')
+    parser.add_argument('--broadcast-delay', type=float, default=0.1)
+    parser.add_argument('--datagram-delay', type=float, default=0.01)
+    parser.add_argument('--check-in-period', type=float, default=5)
+    parser.add_argument('--max-clock-sync-error', type=float, default=0.05)
+    parser.add_argument('--lookahead', type=float, default=None)
+    parser.add_argument('--until', type=float, default=20, help='virtual seconds to simulate')
+    parser.add_argument('--crash', action='append', default=[], metavar='TIME:ID',
+                        help='crash processor ID at virtual time TIME, may be repeated')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    crashes = [(float(t), int(pid)) for t, pid in (crash.split(':') for crash in args.crash)]
+    simulation = ShardedSimulation(args.protocol, args.processors, args.broadcast_delay, args.datagram_delay,
+                                   args.check_in_period, args.max_clock_sync_error, args.shards, args.seed,
+                                   args.lookahead)
+    result = simulation.run(args.until, crashes)
+    messages = sum(result['sent_counts'].values())
+    print(f"{args.protocol} N={args.processors} shards={simulation.shards} until={args.until}s "
+          f"agreed={result['agreed']} messages={messages} windows={result['windows']} "
+          f"wall={result['wall_seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
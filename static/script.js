@@ -10,6 +10,8 @@ function startButtonOnclick() {
     let broadcastDelay = document.getElementById('broadcast_delay').value;
     let datagramDelay = document.getElementById('datagram_delay').value;
     let checkInPeriod = document.getElementById('check_in_period').value;
+    let runtime = document.getElementById('runtime').value;
+    let joinCoalescing = document.getElementById('join_coalescing').checked;
 
     if (!isCheckInPeriodValid(maxClockSyncError, broadcastDelay, datagramDelay, checkInPeriod)) {
         alert(`Check in period is too small. check in ${checkInPeriod} broadcastDelay ${broadcastDelay} max sync error ${maxClockSyncError}`);
@@ -19,7 +21,9 @@ function startButtonOnclick() {
             max_clock_sync_error: maxClockSyncError,
             broadcast_delay: broadcastDelay,
             datagram_delay: datagramDelay,
-            check_in_period: checkInPeriod
+            check_in_period: checkInPeriod,
+            runtime: runtime,
+            join_coalescing: joinCoalescing
         }
         fetch(url, {
             method: 'POST',
@@ -54,13 +58,11 @@ function crashButtonOnClick() {
     }).then((response) => {
         if (response.status !== 200) {
             alert('Crash failed');
-        } else {
-            fetchAndDisplayAllProcessors(true);
         }
     });
 }
 
-let timeout = undefined;
+let eventSource = undefined;
 
 function init() {
     let url = new URL(window.location.href);
@@ -69,28 +71,47 @@ function init() {
     words = words.map(word => toTitleCase(word));
 
     document.getElementById("headline").textContent = words.join(" ");
+    updateDate();
+    setInterval(updateDate, 1000);
     fetchAndDisplayAllProcessors(true);
 }
 
 /**
- * Fetches all the processors either working or crashed, and displays them in the page
+ * Fetches all the processors either working or crashed, displays them in the page, then
+ * subscribes to the changes made after the fetched version
  */
 function fetchAndDisplayAllProcessors(updateAll) {
-    if (timeout !== undefined) {
-        clearTimeout(timeout);
+    if (eventSource !== undefined) {
+        eventSource.close();
+        eventSource = undefined;
     }
-    updateDate();
     const url = '/all-processors';
     fetch(url).then((response) => {
         if (response.status === 200) {
+            let version = response.headers.get('X-Group-Version');
             response.json().then((data) => {
                 updateProcessor(data, updateAll);
-                timeout = setTimeout(() => fetchAndDisplayAllProcessors(false), 1000);
+                subscribeToChanges(version);
             });
         }
     });
 }
 
+/**
+ * Listens on the server's event stream and updates only the processors that changed,
+ * starting over from a full fetch when the server asks for a reset
+ */
+function subscribeToChanges(version) {
+    eventSource = new EventSource(`/events?since=${version}`);
+    eventSource.onmessage = (event) => {
+        let delta = JSON.parse(event.data);
+        for (let processor of delta.processors) {
+            displayProcessor(processor);
+        }
+    };
+    eventSource.addEventListener('reset', () => fetchAndDisplayAllProcessors(true));
+}
+
 /**
  * Updates the timer displays on the page every second
  */
@@ -115,12 +136,7 @@ function updateProcessor(data, updateAll) {
     }
 
     for (let processor of data) {
-        let node = document.createElement('li');
-        node.appendChild(document.createTextNode(
-            `Processor ${processor.id}, 
-                                status: ${processor.status}, 
-                                members: ${processor.members}`));
-        list.appendChild(node);
+        displayProcessor(processor);
 
         if (updateAll) {
             let option = document.createElement('option');
@@ -130,6 +146,21 @@ function updateProcessor(data, updateAll) {
     }
 }
 
+/**
+ * Creates or updates the list entry of a single processor
+ */
+function displayProcessor(processor) {
+    let node = document.getElementById(`processor-${processor.id}`);
+    if (node === null) {
+        node = document.createElement('li');
+        node.id = `processor-${processor.id}`;
+        document.querySelector('ul').appendChild(node);
+    }
+    node.textContent = `Processor ${processor.id}, 
+                                status: ${processor.status}, 
+                                members: ${processor.members}`;
+}
+
 function removeAllChildNodes(parent) {
     while (parent.firstChild) {
         parent.removeChild(parent.firstChild);
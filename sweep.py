@@ -0,0 +1,130 @@
+import argparse
+import csv
+import itertools
+import json
+import statistics
+
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmark import PROTOCOLS, build_group, wait_for_agreement
+
+DEFAULT_GRID = {
+    'protocol': list(PROTOCOLS),
+    'num_processors': [20],
+    'broadcast_delay': [0.1],
+    'datagram_delay': [0.01],
+    'max_clock_sync_error': [0.05],
+    'check_in_period': [1, 5],
+    'crash_schedule': [[[1.0, 1]]],
+    'join_coalescing': [False],
+    'attendance_tokens': [1],
+    'seed': [0, 1, 2],
+}
+
+CONFIGURATION_KEYS = ('protocol', 'num_processors', 'broadcast_delay', 'datagram_delay', 'max_clock_sync_error',
+                      'check_in_period', 'crash_schedule', 'join_coalescing', 'attendance_tokens')
+
+
+def expand_grid(grid):
+    """Returns one configuration dict for every combination of the values listed in grid"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def run_configuration(config):
+    """Runs one configuration on its own channel and virtual clock and returns its results as a dict
+
+    The crash schedule is a list of [seconds, count] pairs: that many randomly chosen correct processors crash the
+    given number of seconds after the group has formed. The crashes happen in turn: the detection latency of each is
+    the time from it until the surviving views next agree, measured before the clock advances to the next crash, which
+    happens at its scheduled time or right after the previous one is detected if that takes longer. Each channel
+    numbers its own processors and messages, so configurations can run side by side in the worker processes of a pool.
+    """
+    scheduler, channel = build_group(config['protocol'], config['num_processors'], config['broadcast_delay'],
+                                     config['datagram_delay'], config['check_in_period'],
+                                     config['max_clock_sync_error'], seed=config['seed'],
+                                     join_coalescing=config['join_coalescing'],
+                                     attendance_tokens=config['attendance_tokens'])
+    poll_interval = min(config['broadcast_delay'], config['datagram_delay']) / 4
+    timeout = 10 * config['check_in_period'] + config['num_processors'] * config['datagram_delay']
+
+    for processor in channel.processors:
+        processor.init_join()
+    convergence_time = wait_for_agreement(scheduler, channel, poll_interval, timeout)
+
+    start = scheduler.now()
+    sent_before = sum(channel.sent_counts.values())
+    latencies = []
+    for delay, count in sorted(config['crash_schedule']):
+        if scheduler.now() < start + delay:
+            scheduler.run(start + delay)
+        _crash_random_processors(channel, count)
+        latencies.append(wait_for_agreement(scheduler, channel, poll_interval, timeout))
+    periods = (scheduler.now() - start) / config['check_in_period']
+    messages = sum(channel.sent_counts.values()) - sent_before
+
+    return {
+        **config,
+        'convergence_time': convergence_time,
+        'detection_latencies': latencies,
+        'messages_per_period': messages / periods if periods else 0.0,
+    }
+
+
+def _crash_random_processors(channel, count):
+    correct = [p for p in channel.processors if p.status == p.NORMAL]
+    for processor in channel.random.sample(correct, min(count, len(correct))):
+        processor.crash()
+
+
+def aggregate(results):
+    """Groups results by configuration, ignoring the seed, and returns one summary row per configuration"""
+    groups = {}
+    for result in results:
+        key = json.dumps([result[key] for key in CONFIGURATION_KEYS])
+        groups.setdefault(key, []).append(result)
+
+    rows = []
+    for runs in groups.values():
+        latencies = [latency for run in runs for latency in run['detection_latencies']]
+        detected = [latency for latency in latencies if latency is not None]
+        rows.append({
+            **{key: runs[0][key] for key in CONFIGURATION_KEYS},
+            'runs': len(runs),
+            'mean_detection_latency': statistics.mean(detected) if detected else None,
+            'max_detection_latency': max(detected) if detected else None,
+            'undetected_crashes': len(latencies) - len(detected),
+            'mean_messages_per_period': statistics.mean(run['messages_per_period'] for run in runs),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a grid of channel configurations across a process pool.')
+    parser.add_argument('--grid', help='JSON file mapping each configuration key to a list of values to sweep')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, all cores by default')
+    parser.add_argument('--output', default='sweep_results.csv', help='CSV file the aggregated table is written to')
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID)
+    if args.grid is not None:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(run_configuration, expand_grid(grid)))
+    rows = aggregate(results)
+    if not rows:
+        print('The grid has no configurations to run')
+        return
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    for row in rows:
+        print(', '.join(f'{key}={value}' for key, value in row.items()))
+
+
+if __name__ == '__main__':
+    main()
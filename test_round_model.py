@@ -0,0 +1,36 @@
+import unittest
+from unittest import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import round_model
+
+SEEDS = range(50)
+
+
+@unittest.skipIf(numpy is None, 'the round model needs numpy')
+class CrossCheckTest(unittest.TestCase):
+    def test_models_agree(self):
+        rows = round_model.cross_check(seeds=SEEDS)
+        self.assertEqual([row for row in rows if not row['agrees']], [])
+
+    def test_detection_latency_offset_is_a_mismatch(self):
+        run_round_scenario = round_model.run_round_scenario
+
+        def late_detection(*args, **kwargs):
+            result = run_round_scenario(*args, **kwargs)
+            if result['detection_latency'] is not None:
+                result['detection_latency'] += 0.05
+            return result
+
+        with mock.patch.object(round_model, 'run_round_scenario', late_detection):
+            rows = round_model.cross_check(['periodic-broadcast'], sizes=(10,), seeds=SEEDS)
+        agrees = {row['metric']: row['agrees'] for row in rows}
+        self.assertEqual(agrees, {'convergence_time': True, 'detection_latency': False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import threading
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import monotonic_to_datetime
+
+
+class WheelTimer:
+    """A pending timer in a TimerWheelScheduler
+
+    Attributes:
+        deadline: A float indicating the time in seconds the timer is due at
+        tick: A int indicating the wheel tick the timer is due at
+        callback: The function to call when the timer fires
+        args: A tuple of arguments passed to the callback
+        cancelled: A bool indicating whether the timer has been cancelled
+    """
+
+    __slots__ = ('deadline', 'tick', 'callback', 'args', 'cancelled', '_scheduler')
+
+    def __init__(self, scheduler, deadline, tick, callback, args):
+        self._scheduler = scheduler
+        self.deadline = deadline
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancels the timer in O(1), it is dropped from the wheel when its slot is next visited"""
+        self._scheduler._cancel(self)
+
+
+class TimerWheelScheduler:
+    """A real-time scheduler that drives every timer from one dispatcher thread
+
+    Timers live in a hierarchical hashed timer wheel. Level 0 has one slot per tick, and each higher level has slots
+    that are wheel_size times wider than the level below; when the lower level wraps around, the matching slot of the
+    level above is cascaded down. Adding and cancelling a timer are O(1). Due callbacks are handed to a fixed-size
+    worker pool, so the number of threads stays the same however many processors or messages there are.
+
+    Attributes:
+        _tick: A float indicating the length of one wheel tick in seconds
+        _wheel_size: A int indicating the number of slots on each level
+        _levels: A list of levels, each a list of wheel_size slots holding WheelTimer lists
+        _start: A float indicating the time in seconds that tick 0 started at
+        _current_tick: A int indicating the last tick the dispatcher has processed
+        _backlog: A int counting timers that have been added but neither fired nor cancelled
+        _fired: A int counting timers that have fired
+        _total_lateness: A float summing how late every fired timer was handed to the worker pool
+        _max_lateness: A float indicating the largest lateness seen so far
+    """
+
+    def __init__(self, tick=0.01, wheel_size=256, levels=4, workers=4):
+        self._tick = tick
+        self._wheel_size = wheel_size
+        self._levels = [[[] for _ in range(wheel_size)] for _ in range(levels)]
+        self._spans = [wheel_size ** level for level in range(levels + 1)]
+        self._start = time.monotonic()
+        self._current_tick = 0
+        self._backlog = 0
+        self._fired = 0
+        self._total_lateness = 0.0
+        self._max_lateness = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._running = True
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='timer-wheel-worker')
+        self._dispatcher = threading.Thread(target=self._dispatch, name='timer-wheel-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    @staticmethod
+    def now():
+        """Returns the current monotonic time in seconds"""
+        return time.monotonic()
+
+    @staticmethod
+    def to_datetime(seconds):
+        """Returns the local datetime of a reading of now(), for display only"""
+        return monotonic_to_datetime(seconds)
+
+    def call_later(self, delay, callback, *args):
+        """Runs callback(*args) on the worker pool after delay seconds
+
+        Returns:
+            A WheelTimer that can be cancelled
+        """
+        deadline = time.monotonic() + max(delay, 0)
+        with self._lock:
+            was_idle = self._backlog == 0
+            if was_idle:
+                # Nothing is pending, so the wheel can jump straight to the present tick
+                self._current_tick = max(self._current_tick, int((time.monotonic() - self._start) // self._tick))
+            tick = max(int(-(-(deadline - self._start) // self._tick)), self._current_tick + 1)
+            timer = WheelTimer(self, deadline, tick, callback, args)
+            self._insert(timer)
+            self._backlog += 1
+            if was_idle:
+                self._wakeup.notify()
+        return timer
+
+    def stop(self):
+        """Stops the dispatcher thread and the worker pool, pending timers never fire"""
+        with self._lock:
+            self._running = False
+            self._wakeup.notify()
+        self._dispatcher.join()
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        """Returns a dict with the backlog of pending timers and how late fired timers were, in seconds"""
+        with self._lock:
+            fired = self._fired
+            return {
+                'backlog': self._backlog,
+                'fired': fired,
+                'mean_lateness': self._total_lateness / fired if fired else 0.0,
+                'max_lateness': self._max_lateness,
+            }
+
+    def _cancel(self, timer):
+        with self._lock:
+            if not timer.cancelled:
+                timer.cancelled = True
+                self._backlog -= 1
+
+    def _insert(self, timer):
+        remaining = timer.tick - self._current_tick
+        for level, slots in enumerate(self._levels):
+            if remaining < self._spans[level + 1] or level == len(self._levels) - 1:
+                # Timers beyond the top level are parked in its last slot and re-inserted when it cascades
+                tick = min(timer.tick, self._current_tick + self._spans[level + 1] - 1)
+                slots[(tick // self._spans[level]) % self._wheel_size].append(timer)
+                return
+
+    def _advance(self):
+        """Moves the wheel forward by one tick and returns the timers due in it"""
+        self._current_tick += 1
+        tick = self._current_tick
+        for level in range(1, len(self._levels)):
+            if tick % self._spans[level]:
+                break
+            slot = self._levels[level][(tick // self._spans[level]) % self._wheel_size]
+            cascaded = slot[:]
+            slot.clear()
+            for timer in cascaded:
+                if not timer.cancelled:
+                    self._insert(timer)
+        slot = self._levels[0][tick % self._wheel_size]
+        due = [timer for timer in slot if not timer.cancelled]
+        slot.clear()
+        return due
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                while self._running and self._backlog == 0:
+                    self._wakeup.wait()
+                if not self._running:
+                    return
+                delay = self._start + (self._current_tick + 1) * self._tick - time.monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                due = []
+                target = int((time.monotonic() - self._start) // self._tick)
+                while self._current_tick < target and self._backlog > len(due):
+                    due.extend(self._advance())
+                if self._backlog == len(due):
+                    self._current_tick = max(self._current_tick, target)
+                now = time.monotonic()
+                for timer in due:
+                    timer.cancelled = True
+                    lateness = max(now - timer.deadline, 0.0)
+                    self._total_lateness += lateness
+                    self._max_lateness = max(self._max_lateness, lateness)
+                self._backlog -= len(due)
+                self._fired += len(due)
+            for timer in due:
+                self._pool.submit(self._run, timer)
+
+    @staticmethod
+    def _run(timer):
+        try:
+            timer.callback(*timer.args)
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,375 @@
+import argparse
+import itertools
+import mmap
+import struct
+import time
+
+from channel import Channel
+from membership import MemberView
+from message import Message
+from processor import Processor
+from scheduler import SimulationScheduler
+
+MAGIC = b'GMTR'
+FORMAT_VERSION = 1
+BUFFER_SIZE = 1 << 20
+
+PROCESSOR = 1
+CREATE = 2
+SEND = 3
+DELIVER = 4
+TIMER = 5
+CRASH = 6
+JOIN = 7
+VIEW = 8
+DELAYS = 9
+
+KIND_NAMES = {PROCESSOR: 'processor', CREATE: 'create', SEND: 'send', DELIVER: 'deliver', TIMER: 'timer',
+              CRASH: 'crash', JOIN: 'join', VIEW: 'view', DELAYS: 'delays'}
+TIMER_NAMES = ('schedule_broadcast', '_check_membership', '_check_attendance_list', '_check_neighbor_present',
+               '_pending_join_due', '_send_digest', '_check_digest_ack')
+JOIN_CAUSES = (Processor.JOIN_MANUAL, Processor.JOIN_MEMBERSHIP_CHECK, Processor.JOIN_ATTENDANCE_LIST,
+               Processor.JOIN_NEIGHBOR, Processor.JOIN_HIERARCHY, Processor.JOIN_RECOVERY)
+OTHER = 255
+
+# magic, format version, broadcast delay, datagram delay
+_FILE_HEADER = struct.Struct('<4sBdd')
+# Every record starts with its kind and the scheduler time it happened at
+_KIND = struct.Struct('<B')
+_RECORDS = {
+    # processor id, clock error, max clock sync error, check-in period, protocol, join coalescing, attendance tokens
+    PROCESSOR: struct.Struct('<BdIdddB?H'),
+    # message id, sender id, the sender's message sequence number, type
+    CREATE: struct.Struct('<BdQIIB'),
+    # message id, receiver id (0 for a broadcast)
+    SEND: struct.Struct('<BdQI'),
+    # message id, receiver id
+    DELIVER: struct.Struct('<BdQI'),
+    # processor id, the processor's timer sequence number, timer callback (an index into TIMER_NAMES)
+    TIMER: struct.Struct('<BdIIB'),
+    # processor id
+    CRASH: struct.Struct('<BdI'),
+    # processor id, cause (an index into JOIN_CAUSES)
+    JOIN: struct.Struct('<BdIB'),
+    # processor id, group, length of the view bitmask bytes that follow
+    VIEW: struct.Struct('<BdIdI'),
+    # broadcast delay, datagram delay
+    DELAYS: struct.Struct('<Bddd'),
+}
+
+
+class TraceRecorder:
+    """Writes everything that happens in a channel to an append-only binary trace file
+
+    A traced channel calls the recorder for every message created, sent and delivered, every processor timer that
+    fires, every crash, join and view change. Each call packs one fixed-size little-endian record, a kind byte and
+    the scheduler time followed by a few ids, and hands it to a buffered file, so recording costs a struct pack and a
+    memory copy on the hot paths; the file is only written in BUFFER_SIZE chunks.
+
+    Messages and timers are identified in the trace by their processor and a per-processor sequence number rather
+    than by the channel's ids, so a replay that runs the processors through the same inputs finds them again no
+    matter in which order the processors interleave.
+
+    Attributes:
+        _file: The buffered binary file the records are written to
+        _write: The write method of _file, replaced by a no-op once the recorder is closed
+        _now: The now method of the traced channel's scheduler
+        _message_sequences: A dict mapping each processor id to an iterator numbering the messages it creates
+        _timer_sequences: A dict mapping each processor id to an iterator numbering the timers it schedules
+    """
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._write = self._file.write
+        self._now = None
+        self._message_sequences = {}
+        self._timer_sequences = {}
+
+    def attach(self, channel):
+        """Writes the file header for the given channel and starts timing records with its scheduler"""
+        self._now = channel.scheduler.now
+        self._write(_FILE_HEADER.pack(MAGIC, FORMAT_VERSION, channel.broadcast_delay, channel.datagram_delay))
+
+    def processor_registered(self, processor):
+        self._message_sequences[processor.id] = itertools.count()
+        self._timer_sequences[processor.id] = itertools.count()
+        self._write(_RECORDS[PROCESSOR].pack(PROCESSOR, self._now(), processor.id, processor.clock_error,
+                                             *processor.settings))
+
+    def created(self, message):
+        sender_id = message.sender.id
+        self._write(_RECORDS[CREATE].pack(CREATE, self._now(), message.id, sender_id,
+                                          next(self._message_sequences[sender_id]), message.type))
+
+    def sent(self, message, receiver_id=None):
+        """Records a datagram to receiver_id, or a broadcast if it is None"""
+        self._write(_RECORDS[SEND].pack(SEND, self._now(), message.id, receiver_id or 0))
+
+    def delivered(self, message, processor):
+        self._write(_RECORDS[DELIVER].pack(DELIVER, self._now(), message.id, processor.id))
+
+    def timer_scheduled(self, processor):
+        """Returns the sequence number of a timer the given processor is scheduling"""
+        return next(self._timer_sequences[processor.id])
+
+    def timer_fired(self, processor, sequence, callback, args):
+        """Records the firing of the given timer and runs its callback"""
+        name = callback.__name__
+        self._write(_RECORDS[TIMER].pack(TIMER, self._now(), processor.id, sequence,
+                                         TIMER_NAMES.index(name) if name in TIMER_NAMES else OTHER))
+        callback(*args)
+
+    def crashed(self, processor):
+        self._write(_RECORDS[CRASH].pack(CRASH, self._now(), processor.id))
+
+    def joined(self, processor, cause):
+        self._write(_RECORDS[JOIN].pack(JOIN, self._now(), processor.id,
+                                        JOIN_CAUSES.index(cause) if cause in JOIN_CAUSES else OTHER))
+
+    def view_changed(self, processor):
+        bits = processor.view.bits
+        view_bytes = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        self._write(_RECORDS[VIEW].pack(VIEW, self._now(), processor.id, processor.group, len(view_bytes)) +
+                    view_bytes)
+
+    def delays_changed(self, channel):
+        self._write(_RECORDS[DELAYS].pack(DELAYS, self._now(), channel.broadcast_delay, channel.datagram_delay))
+
+    def close(self):
+        """Flushes the buffered records and closes the file, later records are dropped"""
+        if self._write != self._discard:
+            self._write = self._discard
+            self._file.close()
+
+    @staticmethod
+    def _discard(record):
+        pass
+
+
+def read_trace(path):
+    """Reads a trace file written by a TraceRecorder
+
+    Returns:
+        A (broadcast delay, datagram delay, records) tuple, the records being a list of tuples that start with the
+        record kind and time followed by the fields listed in _RECORDS; a VIEW record ends with the view's bitmask as
+        an int instead of its length. A record cut off at the end of the file is left out.
+    """
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, broadcast_delay, datagram_delay = _FILE_HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} membership trace')
+        records = []
+        offset = _FILE_HEADER.size
+        size = len(data)
+        while offset < size:
+            layout = _RECORDS[_KIND.unpack_from(data, offset)[0]]
+            if offset + layout.size > size:
+                # The recording process died halfway through writing its last record
+                break
+            record = layout.unpack_from(data, offset)
+            offset += layout.size
+            if record[0] == VIEW:
+                length = record[-1]
+                record = record[:-1] + (int.from_bytes(data[offset:offset + length], 'little'),)
+                offset += length
+            records.append(record)
+    return broadcast_delay, datagram_delay, records
+
+
+class ReplayChannel(Channel):
+    """A channel that delivers messages and fires timers at the times a trace recorded instead of drawing delays
+
+    Attributes:
+        _deliveries: A dict mapping each (sender id, sequence) message key to a list of its recorded
+                     [delivery time, receiver id] pairs not replayed yet
+        _timers: A dict mapping each (processor id, sequence) timer key to its recorded firing time
+        _message_keys: A dict mapping the id of each message created in the replay to its key
+        _message_sequences: A dict mapping each processor id to an iterator numbering the messages it creates
+        _timer_sequences: A dict mapping each processor id to an iterator numbering the timers it schedules
+        _views: A dict mapping each processor id to the list of views it has had in the replay
+        unmatched: A int counting the messages and timers the replay produced but the trace does not contain
+    """
+
+    def __init__(self, broadcast_delay, datagram_delay, scheduler, deliveries, timers):
+        super().__init__(broadcast_delay, datagram_delay, scheduler)
+        self._deliveries = deliveries
+        self._timers = timers
+        self._message_keys = {}
+        self._message_sequences = {}
+        self._timer_sequences = {}
+        self._views = {}
+        self.unmatched = 0
+
+    def register_processor(self, processor):
+        self._message_sequences[processor.id] = itertools.count()
+        self._timer_sequences[processor.id] = itertools.count()
+        self._views[processor.id] = []
+        return super().register_processor(processor)
+
+    def view_changed(self, processor, old_view, new_view):
+        super().view_changed(processor, old_view, new_view)
+        self._views[processor.id].append(new_view.bits)
+
+    def create_message(self, processor, msg_type):
+        message = super().create_message(processor, msg_type)
+        self._message_keys[message.id] = (processor.id, next(self._message_sequences[processor.id]))
+        return message
+
+    def schedule_timer(self, processor, delay, callback, *args):
+        fire_time = self._timers.pop((processor.id, next(self._timer_sequences[processor.id])), None)
+        if fire_time is None:
+            # The timer was cancelled before it fired in the recorded run, or fired after the trace ends
+            return self._scheduler.call_later(delay, callback, *args)
+        return self._scheduler.call_at(fire_time, callback, *args)
+
+    def send_message(self, message):
+        receiver = message.receiver
+        if receiver.status == Processor.CRASHED:
+            return
+        pending = self._deliveries.get(self._message_keys[message.id], ())
+        for index, (fire_time, receiver_id) in enumerate(pending):
+            if receiver_id == receiver.id:
+                del pending[index]
+                self._deliver_at(fire_time, message, receiver, 'datagram', self._datagram_delay)
+                return
+        self.unmatched += 1
+
+    def broadcast(self, message):
+        if message.sender.status == Processor.CRASHED:
+            return
+        message.freeze()
+        pending = self._deliveries.pop(self._message_keys[message.id], None)
+        if pending is None:
+            self.unmatched += 1
+            return
+        for fire_time, receiver_id in pending:
+            self._deliver_at(fire_time, message, self._all_processors[receiver_id], 'broadcast',
+                             self._broadcast_delay)
+
+    def _deliver_at(self, fire_time, message, receiver, kind, bound):
+        self._sent_total.inc(Message.TYPE_NAMES[message.type])
+        self._processor_sent_total.inc(message.sender.id)
+        self._scheduler.call_at(fire_time, self._send_message_to, message, receiver, self._scheduler.now(), kind,
+                                bound)
+
+    @property
+    def views(self):
+        return self._views
+
+
+def replay_trace(path):
+    """Replays a trace at full speed on a virtual clock
+
+    The processors are rebuilt with their recorded settings and clock errors when they were registered. Manual
+    joins, crashes, recoveries and delay changes are injected at their recorded times, every message is delivered at
+    its recorded delivery time and every timer fires at its recorded firing time, so the processors go through the
+    recorded run again without any real waiting.
+
+    Traces of runtimes that run one callback at a time, the SimulationScheduler, AsyncioScheduler and
+    TimerWheelScheduler, replay the same views; the group timestamps of a real-time run only differ by how far apart
+    the recorder's and the processors' clock readings were. A ThreadScheduler runs callbacks on racing threads, so the
+    order the trace records is not always the order they took effect in, and the replay may take another turn.
+
+    Returns:
+        A dict with each processor's final (status, view bits, group), the number of records, the ids of the
+        processors whose sequence of views differs from the recorded one, the number of messages and timers the trace
+        does not contain, and the virtual and wall-clock seconds the replay covered and took.
+    """
+    broadcast_delay, datagram_delay, records = read_trace(path)
+    message_keys = {}
+    deliveries = {}
+    timers = {}
+    inputs = []
+    recorded_views = {}
+    external_joins = (JOIN_CAUSES.index(Processor.JOIN_MANUAL), JOIN_CAUSES.index(Processor.JOIN_RECOVERY))
+    for record in records:
+        kind, at = record[0], record[1]
+        if kind in (PROCESSOR, CRASH, DELAYS) or (kind == JOIN and record[3] in external_joins):
+            inputs.append(record)
+        elif kind == CREATE:
+            message_id, sender_id, sequence = record[2:5]
+            message_keys[message_id] = key = (sender_id, sequence)
+            deliveries[key] = []
+        elif kind == DELIVER:
+            deliveries[message_keys[record[2]]].append([at, record[3]])
+        elif kind == TIMER:
+            timers[record[2], record[3]] = at
+        elif kind == VIEW:
+            recorded_views.setdefault(record[2], []).append(record[4])
+    start = records[0][1] if records else 0.0
+    end = records[-1][1] if records else 0.0
+
+    wall_start = time.perf_counter()
+    scheduler = SimulationScheduler(start)
+    channel = ReplayChannel(broadcast_delay, datagram_delay, scheduler, deliveries, timers)
+    for record in inputs:
+        scheduler.call_at(record[1], _inject, channel, record)
+    scheduler.run(end)
+    wall_seconds = time.perf_counter() - wall_start
+
+    return {
+        'processors': {p.id: (p.status, p.view.bits, p.group) for p in channel.processors},
+        'records': len(records),
+        'diverged': sorted(pid for pid, views in channel.views.items() if views != recorded_views.get(pid, [])),
+        'unmatched': channel.unmatched,
+        'virtual_seconds': end - start,
+        'wall_seconds': wall_seconds,
+    }
+
+
+def _inject(channel, record):
+    """Makes the replayed group go through a change that came from outside the processors in the recorded run"""
+    kind = record[0]
+    if kind == PROCESSOR:
+        processor_id, clock_error, *settings = record[2:]
+        processor = Processor(channel, *settings)
+        if processor.id != processor_id:
+            raise ValueError(f'the trace has processor {processor_id} where {processor.id} was expected')
+        processor.clock_error = clock_error
+        channel.register_processor(processor)
+    elif kind == DELAYS:
+        channel.set_delays(*record[2:])
+    elif kind == CRASH:
+        channel.find_processor(record[2]).crash()
+    elif JOIN_CAUSES[record[3]] == Processor.JOIN_RECOVERY:
+        channel.find_processor(record[2]).recover()
+    else:
+        channel.find_processor(record[2]).init_join()
+
+
+def _format_record(record):
+    kind, at = record[0], record[1]
+    fields = record[2:]
+    if kind == TIMER:
+        fields = fields[:2] + (TIMER_NAMES[fields[2]] if fields[2] < len(TIMER_NAMES) else 'other',)
+    elif kind == JOIN:
+        fields = fields[:1] + (JOIN_CAUSES[fields[1]] if fields[1] < len(JOIN_CAUSES) else 'other',)
+    elif kind == CREATE:
+        fields = fields[:3] + (Message.TYPE_NAMES.get(fields[3], fields[3]),)
+    elif kind == VIEW:
+        fields = fields[:2] + (list(MemberView.from_bits(fields[2])),)
+    return f"{at:.6f} {KIND_NAMES[kind]} {' '.join(str(field) for field in fields)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prints or replays a membership trace file.')
+    parser.add_argument('command', choices=('dump', 'replay'))
+    parser.add_argument('path')
+    parser.add_argument('--limit', type=int, default=None, help='print at most this many records with dump')
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        _, _, records = read_trace(args.path)
+        for record in records[:args.limit]:
+            print(_format_record(record))
+        return
+    result = replay_trace(args.path)
+    for processor_id, (status, bits, group) in result['processors'].items():
+        state = 'normal' if status == Processor.NORMAL else 'crashed'
+        print(f'processor {processor_id} {state} group={group} view={list(MemberView.from_bits(bits))}')
+    print(f"replayed {result['records']} records covering {result['virtual_seconds']:.3f}s in "
+          f"{result['wall_seconds']:.3f}s, diverged={result['diverged']} unmatched={result['unmatched']}")
+
+
+if __name__ == '__main__':
+    main()
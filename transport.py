@@ -0,0 +1,176 @@
+import itertools
+import socket
+
+from async_scheduler import AsyncioScheduler, _in_loop
+from processor import Processor
+from wire import decode_message, encode_message, framed_size, pack_frames, unpack_frames
+
+MAX_PAYLOAD = 60000
+
+
+class RemoteProcessor:
+    """Stands in for a processor hosted by another process
+
+    Processors only ever look at the id of a message's sender or the receiver they address, so a remote processor is
+    just its id. Its status is not known locally; a message to a crashed remote processor is dropped on arrival.
+    """
+
+    __slots__ = ('id',)
+
+    status = Processor.NORMAL
+
+    def __init__(self, processor_id):
+        self.id = processor_id
+
+
+class InMemoryTransport:
+    """The default transport, every processor lives in the channel's own process and is called directly"""
+
+    def attach(self, channel):
+        """Connects the transport to the channel whose messages it carries"""
+
+    @staticmethod
+    def local_ids():
+        """Returns an iterator over the ids of the processors created in this process"""
+        return itertools.count(1)
+
+    @staticmethod
+    def is_local(processor_id):
+        return True
+
+    def remote(self, processor_id):
+        """Returns the stand-in of a processor hosted elsewhere, None since every processor is local"""
+        return None
+
+    def send(self, message, sent_at, receiver_id=None):
+        """Sends the message to the processes hosting remote receivers, there are none in memory"""
+
+    def close(self):
+        pass
+
+
+class UdpTransport:
+    """Carries messages between processes on localhost over UDP
+
+    Every process hosts a range of processors and owns one non-blocking UDP socket, read by the asyncio event loop of
+    the channel's AsyncioScheduler. A datagram goes straight to the process hosting its receiver; a broadcast goes
+    once to every other process, which delivers it to its own correct processors. The receiving channel draws the
+    delivery delays, so the delays seen by processors are the simulated ones plus the real time on the wire.
+
+    Messages are encoded in the binary format of wire.py. Frames sent while the event loop handles one callback are
+    batched per destination and flushed in as few datagrams as possible once the loop comes round again.
+
+    Attributes:
+        _addresses: A dict mapping each processor id to the (host, port) of the process hosting it
+        _local_address: The (host, port) this process listens on
+        _remote_addresses: A list of the addresses of every other process
+        _channel: The Channel the transport is attached to
+        _loop: The asyncio event loop of the channel's scheduler
+        _socket: The non-blocking UDP socket, None until the transport is attached
+        _pending: A dict mapping each destination address to a [frames, payload size] list waiting to be sent to it
+        _flush_scheduled: A bool indicating whether a flush is already scheduled on the event loop
+        _remote: A dict caching the RemoteProcessor of each remote id seen so far
+        dropped: A int counting the payloads the socket refused to send
+    """
+
+    def __init__(self, addresses, local_address):
+        self._addresses = dict(addresses)
+        self._local_address = tuple(local_address)
+        self._remote_addresses = sorted({address for address in self._addresses.values()
+                                         if address != self._local_address})
+        self._channel = None
+        self._loop = None
+        self._socket = None
+        self._pending = {}
+        self._flush_scheduled = False
+        self._remote = {}
+        self.dropped = 0
+
+    def attach(self, channel):
+        """Binds the socket and starts reading it on the event loop of the channel's AsyncioScheduler"""
+        if not isinstance(channel.scheduler, AsyncioScheduler):
+            raise TypeError('UdpTransport needs a channel running on an AsyncioScheduler')
+        self._channel = channel
+        self._loop = channel.scheduler.loop
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(self._local_address)
+        self._loop.call_soon_threadsafe(self._loop.add_reader, self._socket.fileno(), self._receive)
+
+    def local_ids(self):
+        """Returns an iterator over the ids of the processors hosted by this process, in ascending order"""
+        return iter(sorted(pid for pid, address in self._addresses.items() if address == self._local_address))
+
+    def is_local(self, processor_id):
+        return self._addresses.get(processor_id) == self._local_address
+
+    def remote(self, processor_id):
+        """Returns the RemoteProcessor standing in for the given id, None if no process hosts it"""
+        if processor_id not in self._addresses:
+            return None
+        remote = self._remote.get(processor_id)
+        if remote is None:
+            remote = self._remote[processor_id] = RemoteProcessor(processor_id)
+        return remote
+
+    def send(self, message, sent_at, receiver_id=None):
+        """Queues the message for the process hosting receiver_id, or for every other process if it is None"""
+        if not _in_loop(self._loop):
+            self._loop.call_soon_threadsafe(self.send, message, sent_at, receiver_id)
+            return
+        frame = encode_message(message.id, message.type, message.sender.id, receiver_id, sent_at, message.content)
+        size = framed_size(frame)
+        destinations = self._remote_addresses if receiver_id is None else (self._addresses[receiver_id],)
+        for address in destinations:
+            pending = self._pending.get(address)
+            if pending is None:
+                pending = self._pending[address] = [[], 0]
+            elif pending[1] + size > MAX_PAYLOAD:
+                self._send_payload(address, pending[0])
+                pending[0], pending[1] = [], 0
+            pending[0].append(frame)
+            pending[1] += size
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def close(self):
+        if self._socket is not None:
+            socket_ = self._socket
+            self._socket = None
+            if self._loop.is_closed():
+                socket_.close()
+            else:
+                self._loop.call_soon_threadsafe(self._close_socket, socket_)
+
+    def _close_socket(self, socket_):
+        self._loop.remove_reader(socket_.fileno())
+        socket_.close()
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending = self._pending
+        self._pending = {}
+        for address, (frames, _) in pending.items():
+            if frames:
+                self._send_payload(address, frames)
+
+    def _send_payload(self, address, frames):
+        if self._socket is None:
+            return
+        try:
+            self._socket.sendto(pack_frames(frames), address)
+        except (BlockingIOError, ConnectionRefusedError):
+            self.dropped += 1
+
+    def _receive(self):
+        """Reads every datagram waiting on the socket without blocking and hands its messages to the channel"""
+        while self._socket is not None:
+            try:
+                payload, _ = self._socket.recvfrom(65535)
+            except (BlockingIOError, ConnectionRefusedError):
+                return
+            for frame in unpack_frames(payload):
+                message_id, msg_type, sender_id, receiver_id, sent_at, content = decode_message(frame)
+                self._channel.deliver_remote(message_id, msg_type, self.remote(sender_id), receiver_id, sent_at,
+                                             content)
@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from async_scheduler import AsyncioScheduler
+from benchmark import PROTOCOLS
+from channel import Channel
+from processor import Processor
+from sharded import shard_processor_ids
+from transport import UdpTransport
+
+START_DELAY = 0.5
+
+
+def run_udp_group(protocol, num_processors, processes, broadcast_delay, datagram_delay, check_in_period,
+                  max_clock_sync_error, duration, crashes=(), host='127.0.0.1', base_port=47000, seed=None,
+                  join_coalescing=False, attendance_tokens=1):
+    """Runs one group in real time with its processors spread over several OS processes talking UDP on localhost
+
+    Each process hosts a contiguous range of processor ids on an AsyncioScheduler and listens on base_port plus its
+    index. Once every process is listening, all processors call init_join at the same moment; the given processors
+    crash the given number of seconds later, and the run stops duration seconds after the join.
+
+    Returns:
+        A dict with each processor's final (status, view bits, group), the message counts by type, whether the
+        correct processors agree on the view, the mean broadcast and datagram delays relative to their bounds, and
+        the number of payloads a socket refused to send.
+    """
+    processes = min(processes, num_processors)
+    addresses = {}
+    for index in range(processes):
+        for processor_id in shard_processor_ids(index, processes, num_processors):
+            addresses[processor_id] = (host, base_port + index)
+    config = {
+        'protocol': protocol,
+        'broadcast_delay': broadcast_delay,
+        'datagram_delay': datagram_delay,
+        'check_in_period': check_in_period,
+        'max_clock_sync_error': max_clock_sync_error,
+        'duration': duration,
+        'crashes': list(crashes),
+        'seed': seed,
+        'join_coalescing': join_coalescing,
+        'attendance_tokens': attendance_tokens,
+    }
+
+    connections = []
+    workers = []
+    for index in range(processes):
+        connection, child = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=_host_processors,
+                                         args=(child, addresses, (host, base_port + index), config), daemon=True)
+        worker.start()
+        child.close()
+        connections.append(connection)
+        workers.append(worker)
+    try:
+        for connection in connections:
+            connection.recv()
+        # CLOCK_MONOTONIC is shared by every process on the machine, so one reading serves as the common start
+        start = time.monotonic() + START_DELAY
+        for connection in connections:
+            connection.send(start)
+        reports = [connection.recv() for connection in connections]
+    finally:
+        for worker in workers:
+            worker.join()
+
+    processors = {}
+    sent_counts = {}
+    for report in reports:
+        processors.update(report['processors'])
+        for msg_type, count in report['sent_counts'].items():
+            sent_counts[msg_type] = sent_counts.get(msg_type, 0) + count
+    correct = [pid for pid, (status, _, _) in processors.items() if status == Processor.NORMAL]
+    expected = sum(1 << pid for pid in correct)
+    return {
+        'processors': dict(sorted(processors.items())),
+        'sent_counts': sent_counts,
+        'agreed': all(processors[pid][1] == expected for pid in correct),
+        'broadcast_delay_ratio': _mean_ratio(reports, 'broadcast'),
+        'datagram_delay_ratio': _mean_ratio(reports, 'datagram'),
+        'dropped_payloads': sum(report['dropped'] for report in reports),
+    }
+
+
+def _mean_ratio(reports, kind):
+    samples = [report[kind] for report in reports if report[kind][1]]
+    count = sum(count for _, count in samples)
+    return sum(mean * count for mean, count in samples) / count if count else None
+
+
+def _host_processors(connection, addresses, local_address, config):
+    scheduler = AsyncioScheduler()
+    scheduler.start()
+    transport = UdpTransport(addresses, local_address)
+    channel = Channel(config['broadcast_delay'], config['datagram_delay'], scheduler, seed=config['seed'],
+                      transport=transport)
+    for _ in range(sum(1 for address in addresses.values() if address == tuple(local_address))):
+        channel.register_processor(Processor(channel, config['max_clock_sync_error'], config['check_in_period'],
+                                             PROTOCOLS[config['protocol']], config['join_coalescing'],
+                                             config['attendance_tokens']))
+    connection.send('ready')
+
+    start = connection.recv()
+    for processor in channel.processors:
+        scheduler.call_later(start - scheduler.now(), processor.init_join)
+    for crash_time, processor_id in config['crashes']:
+        processor = channel.find_processor(processor_id)
+        if isinstance(processor, Processor):
+            scheduler.call_later(start + crash_time - scheduler.now(), processor.crash)
+    time.sleep(max(start + config['duration'] - scheduler.now(), 0))
+
+    report = asyncio.run_coroutine_threadsafe(_report(channel, transport), scheduler.loop).result()
+    channel.close()
+    scheduler.stop()
+    connection.send(report)
+
+
+async def _report(channel, transport):
+    return {
+        'processors': {p.id: (p.status, p.view.bits, p.group) for p in channel.processors},
+        'sent_counts': channel.sent_counts,
+        'broadcast': channel.delay_ratio('broadcast'),
+        'datagram': channel.delay_ratio('datagram'),
+        'dropped': transport.dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs one group in real time across OS processes over UDP.')
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='periodic-broadcast')
+    parser.add_argument('--processors', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--broadcast-delay', type=float, default=0.1)
+    parser.add_argument('--datagram-delay', type=float, default=0.05)
+    parser.add_argument('--check-in-period', type=float, default=1)
+    parser.add_argument('--max-clock-sync-error', type=float, default=0.05)
+    parser.add_argument('--duration', type=float, default=5, help='seconds to run after the group is formed')
+    parser.add_argument('--crash', action='append', default=[], metavar='TIME:ID',
+                        help='crash processor ID TIME seconds after the join, may be repeated')
+    parser.add_argument('--base-port', type=int, default=47000)
+    args = parser.parse_args()
+
+    crashes = [(float(t), int(pid)) for t, pid in (crash.split(':') for crash in args.crash)]
+    result = run_udp_group(args.protocol, args.processors, args.processes, args.broadcast_delay,
+                           args.datagram_delay, args.check_in_period, args.max_clock_sync_error, args.duration,
+                           crashes, base_port=args.base_port)
+    print(f"{args.protocol} N={args.processors} processes={args.processes} agreed={result['agreed']} "
+          f"messages={sum(result['sent_counts'].values())} "
+          f"broadcast_delay/bound={result['broadcast_delay_ratio']} "
+          f"datagram_delay/bound={result['datagram_delay_ratio']} dropped={result['dropped_payloads']}")
+
+
+if __name__ == '__main__':
+    main()
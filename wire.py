@@ -0,0 +1,73 @@
+import struct
+
+from membership import MemberView
+
+# type, sender id, receiver id (0 for a broadcast), message id, sent at, content kind
+_HEADER = struct.Struct('!BIIQdB')
+_FLOAT = struct.Struct('!d')
+_LENGTH = struct.Struct('!H')
+_VIEW_LENGTH = struct.Struct('!I')
+
+_CONTENT_NONE = 0
+_CONTENT_FLOAT = 1
+_CONTENT_FLOAT_VIEW = 2
+
+
+def encode_message(message_id, msg_type, sender_id, receiver_id, sent_at, content):
+    """Returns the binary frame of a message
+
+    A frame is a fixed 26-byte header followed by the content. The protocols only ever send no content, a V
+    timestamp, or a V timestamp with a MemberView, which is written as its bitmask bytes.
+
+    Args:
+        receiver_id: The id of the receiving processor, None for a broadcast
+    """
+    if content is None:
+        kind, body = _CONTENT_NONE, b''
+    elif isinstance(content, tuple):
+        V, view = content
+        bits = view.bits
+        view_bytes = bits.to_bytes((bits.bit_length() + 7) // 8, 'big')
+        kind, body = _CONTENT_FLOAT_VIEW, _FLOAT.pack(V) + _VIEW_LENGTH.pack(len(view_bytes)) + view_bytes
+    else:
+        kind, body = _CONTENT_FLOAT, _FLOAT.pack(content)
+    return _HEADER.pack(msg_type, sender_id, receiver_id or 0, message_id, sent_at, kind) + body
+
+
+def decode_message(frame):
+    """Returns the (message id, type, sender id, receiver id, sent at, content) tuple of a frame
+
+    The receiver id is None for a broadcast.
+    """
+    msg_type, sender_id, receiver_id, message_id, sent_at, kind = _HEADER.unpack_from(frame)
+    offset = _HEADER.size
+    if kind == _CONTENT_NONE:
+        content = None
+    elif kind == _CONTENT_FLOAT:
+        content = _FLOAT.unpack_from(frame, offset)[0]
+    else:
+        V = _FLOAT.unpack_from(frame, offset)[0]
+        length = _VIEW_LENGTH.unpack_from(frame, offset + _FLOAT.size)[0]
+        start = offset + _FLOAT.size + _VIEW_LENGTH.size
+        content = (V, MemberView.from_bits(int.from_bytes(frame[start:start + length], 'big')))
+    return message_id, msg_type, sender_id, receiver_id or None, sent_at, content
+
+
+def pack_frames(frames):
+    """Returns the frames joined into one payload, each prefixed by its length"""
+    return b''.join(_LENGTH.pack(len(frame)) + frame for frame in frames)
+
+
+def unpack_frames(payload):
+    """Yields the frames of a payload built by pack_frames"""
+    offset = 0
+    while offset < len(payload):
+        length = _LENGTH.unpack_from(payload, offset)[0]
+        offset += _LENGTH.size
+        yield payload[offset:offset + length]
+        offset += length
+
+
+def framed_size(frame):
+    """Returns how many bytes the frame takes up in a payload"""
+    return _LENGTH.size + len(frame)
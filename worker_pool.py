@@ -0,0 +1,133 @@
+import collections
+import queue
+import threading
+import traceback
+
+
+class Mailbox:
+    """The queue of callbacks waiting to run for one processor
+
+    Posting appends to a deque and never blocks. The mailbox is owned by at most one worker at a time: whoever wins
+    the non-blocking acquire of _owner puts it on the pool's ready queue, and the worker that drains it releases it.
+    Nothing ever waits on _owner, it only stands in for a compare-and-swap flag.
+
+    Attributes:
+        _items: A collections.deque of (callback, args) pairs, in the order they were posted
+        _owner: A threading.Lock held while the mailbox is on the ready queue or being drained
+    """
+
+    __slots__ = ('_items', '_owner')
+
+    def __init__(self):
+        self._items = collections.deque()
+        self._owner = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MailboxTimer:
+    """A processor timer whose callback is posted to the processor's mailbox when it fires
+
+    Cancelling it cancels the scheduler's timer and also drops the callback if it has already fired and is waiting in
+    the mailbox. The processor cancels its timers from its own handlers, which run through the same mailbox, so a
+    callback never runs after the handler that cancelled it.
+
+    Attributes:
+        handle: The handle of the scheduler's timer that posts the callback, None until it is scheduled
+        cancelled: A bool indicating whether the timer has been cancelled
+        _callback: The function to call when the timer fires
+        _args: A tuple of arguments passed to the callback
+    """
+
+    __slots__ = ('handle', 'cancelled', '_callback', '_args')
+
+    def __init__(self, callback, args):
+        self.handle = None
+        self.cancelled = False
+        self._callback = callback
+        self._args = args
+
+    def cancel(self):
+        self.cancelled = True
+        if self.handle is not None:
+            self.handle.cancel()
+
+    def run(self):
+        """Calls the callback unless the timer was cancelled while it waited in the mailbox"""
+        if not self.cancelled:
+            self._callback(*self._args)
+
+
+class WorkerPool:
+    """A fixed number of worker threads running every processor's callbacks through its mailbox
+
+    A Channel created with a pool posts each message delivery and processor timer to the receiving processor's
+    mailbox instead of running it on the scheduler's thread. A ready mailbox is drained by one worker at a time, so a
+    processor's handlers never run concurrently with each other, while different processors are handled in parallel
+    by up to size workers. A worker runs at most batch callbacks of one mailbox before putting it back at the end of
+    the ready queue, so a busy processor cannot starve the others.
+
+    Attributes:
+        _mailboxes: A dict mapping processor ids to their Mailbox, created on the first post
+        _ready: A queue.SimpleQueue of mailboxes that have callbacks and are owned by no worker yet, None stops a worker
+        _batch: A int indicating the most callbacks a worker runs from one mailbox in a row
+        _workers: A list of the worker threads
+    """
+
+    def __init__(self, size=4, batch=64):
+        self._mailboxes = {}
+        self._ready = queue.SimpleQueue()
+        self._batch = batch
+        self._workers = [threading.Thread(target=self._work, name=f'mailbox-worker-{i}', daemon=True)
+                         for i in range(size)]
+        for worker in self._workers:
+            worker.start()
+
+    def post(self, processor, callback, *args):
+        """Queues callback(*args) to run on a worker after the callbacks already posted for the processor"""
+        mailbox = self._mailboxes.get(processor.id)
+        if mailbox is None:
+            mailbox = self._mailboxes.setdefault(processor.id, Mailbox())
+        mailbox._items.append((callback, args))
+        if mailbox._owner.acquire(False):
+            self._ready.put(mailbox)
+
+    def stop(self):
+        """Stops the workers once they finish their current mailbox, callbacks still queued never run"""
+        for _ in self._workers:
+            self._ready.put(None)
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join()
+
+    def stats(self):
+        """Returns a dict with the number of workers and of callbacks waiting in mailboxes"""
+        return {'workers': len(self._workers), 'backlog': sum(len(m) for m in list(self._mailboxes.values()))}
+
+    def _work(self):
+        while True:
+            mailbox = self._ready.get()
+            if mailbox is None:
+                return
+            self._drain(mailbox)
+
+    def _drain(self, mailbox):
+        items = mailbox._items
+        for _ in range(self._batch):
+            try:
+                callback, args = items.popleft()
+            except IndexError:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+        else:
+            # Still owned, so the mailbox goes to the back of the ready queue without another acquire
+            self._ready.put(mailbox)
+            return
+        mailbox._owner.release()
+        # A post between the last popleft and the release saw the mailbox owned and left it to this worker
+        if items and mailbox._owner.acquire(False):
+            self._ready.put(mailbox)